@@ -0,0 +1,35 @@
+"""Aggregation kernels over ResultsTable columns, numba-compiled when available."""
+
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+
+    @njit(cache=True)
+    def round_stats(scores: np.ndarray, passed: np.ndarray) -> tuple[float, float]:
+        """Return ``(mean score, pass rate)``; ``(0.0, 0.0)`` for an empty round."""
+        n = scores.shape[0]
+        if n == 0:
+            return 0.0, 0.0
+        total = 0.0
+        hits = 0
+        for i in range(n):
+            total += scores[i]
+            if passed[i]:
+                hits += 1
+        return total / n, hits / n
+
+else:
+
+    def round_stats(scores: np.ndarray, passed: np.ndarray) -> tuple[float, float]:
+        """Return ``(mean score, pass rate)``; ``(0.0, 0.0)`` for an empty round."""
+        if scores.size == 0:
+            return 0.0, 0.0
+        return float(scores.mean()), float(passed.mean())
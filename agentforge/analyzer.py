@@ -2,14 +2,28 @@
 
 from __future__ import annotations
 
-import json
+import hashlib
+from collections import Counter
 from dataclasses import dataclass, field
 from typing import Any
 
+from .cache import SemanticCache
 from .local_agent import LocalAgent
+from .parsing import extract_first_json
 
+# Invariant instructions sent as the leading system message of every analysis
+# prompt, so the backend can prefill their KV cache once and reuse it.
+ANALYSIS_PROMPT_PREFIX = (
+    "Analyze the agent interaction trace you are given and identify why it failed.\n\n"
+    "Respond with JSON:\n"
+    '{"failure_type": "...", "root_cause": "...", '
+    '"weakness_category": "one of: tool_selection, argument_formatting, '
+    'reasoning, instruction_following, error_recovery", '
+    '"suggested_difficulty_increase": "..."}'
+)
 
-@dataclass
+
+@dataclass(slots=True)
 class FailureAnalysis:
     scenario_id: str
     failure_type: str
@@ -22,49 +36,86 @@ class FailureAnalysis:
 class FailureAnalyzer:
     """Analyzes agent failure traces using the local LLM."""
 
-    def __init__(self, agent: LocalAgent | None = None):
+    def __init__(
+        self,
+        agent: LocalAgent | None = None,
+        cache: SemanticCache | None = None,
+    ):
         self.agent = agent or LocalAgent()
+        self.cache = cache
 
     def analyze(self, traces: list[Any]) -> list[FailureAnalysis]:
-        failed_traces = [t for t in traces if not t.success and not t.error]
-        if not failed_traces:
-            failed_traces = [t for t in traces if t.error]
+        # Prefer traces that ran cleanly but failed; fall back to errored ones.
+        soft_fails: list[Any] = []
+        hard_fails: list[Any] = []
+        for t in traces:
+            if t.error:
+                hard_fails.append(t)
+            elif not t.success:
+                soft_fails.append(t)
+        failed_traces = soft_fails or hard_fails
         if not failed_traces:
             return []
 
-        analyses = []
-        for trace in failed_traces:
-            analysis = self._analyze_single(trace)
-            analyses.append(analysis)
-        return analyses
-
-    def _analyze_single(self, trace: Any) -> FailureAnalysis:
+        # Traces that made the same tool calls and ended the same way get one
+        # LLM analysis, fanned back out to every trace that shares it.
+        digests = [self._trace_digest(trace) for trace in failed_traces]
+        representatives: dict[bytes, Any] = {}
+        for digest, trace in zip(digests, failed_traces):
+            representatives.setdefault(digest, trace)
+
+        prompts = [self._build_prompt(trace) for trace in representatives.values()]
+        responses: list[str | None] = [
+            self.cache.lookup(prompt) if self.cache is not None else None
+            for prompt in prompts
+        ]
+        misses = [i for i, response in enumerate(responses) if response is None]
+        if misses:
+            generated = self.agent.generate_batch(
+                [
+                    [
+                        {"role": "system", "content": ANALYSIS_PROMPT_PREFIX},
+                        {"role": "user", "content": prompts[i]},
+                    ]
+                    for i in misses
+                ],
+                cache_prefix=True,
+            )
+            for i, response in zip(misses, generated):
+                responses[i] = response
+                if self.cache is not None:
+                    self.cache.add(prompts[i], response)
+
+        by_digest = dict(zip(representatives, responses))
+        return [
+            self._parse_analysis(trace, by_digest[digest])
+            for trace, digest in zip(failed_traces, digests)
+        ]
+
+    @staticmethod
+    def _trace_digest(trace: Any) -> bytes:
+        tool_calls_str = ", ".join(tc.name for tc in trace.tool_calls)
+        final_response = (trace.final_response or "")[:200]
+        key = f"{tool_calls_str}|{trace.error or ''}|{final_response}"
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _build_prompt(self, trace: Any) -> str:
         messages_str = "\n".join(
             f"[{m['role']}]: {m['content'][:200]}" for m in trace.messages
         )
         tool_calls_str = ", ".join(tc.name for tc in trace.tool_calls) or "none"
 
-        prompt = (
-            "Analyze this agent interaction trace and identify why it failed.\n\n"
+        return (
             f"Scenario: {trace.scenario_id}\n"
             f"Tool calls made: {tool_calls_str}\n"
             f"Final response: {trace.final_response[:200] if trace.final_response else 'none'}\n"
             f"Error: {trace.error or 'none'}\n\n"
-            f"Messages:\n{messages_str}\n\n"
-            "Respond with JSON:\n"
-            '{"failure_type": "...", "root_cause": "...", '
-            '"weakness_category": "one of: tool_selection, argument_formatting, '
-            'reasoning, instruction_following, error_recovery", '
-            '"suggested_difficulty_increase": "..."}'
+            f"Messages:\n{messages_str}"
         )
 
-        messages = [{"role": "user", "content": prompt}]
-        response = self.agent.generate(messages)
-
-        # Parse the response
-        try:
-            parsed = json.loads(response)
-        except json.JSONDecodeError:
+    def _parse_analysis(self, trace: Any, response: str) -> FailureAnalysis:
+        parsed = extract_first_json(response)
+        if parsed is None:
             parsed = {
                 "failure_type": "unknown",
                 "root_cause": response[:200],
@@ -87,14 +138,13 @@ class FailureAnalyzer:
         if not analyses:
             return {"total_failures": 0, "categories": {}}
 
-        categories: dict[str, int] = {}
-        for a in analyses:
-            categories[a.weakness_category] = categories.get(a.weakness_category, 0) + 1
+        categories = Counter(a.weakness_category for a in analyses)
+        top = categories.most_common(1)
 
         return {
             "total_failures": len(analyses),
-            "categories": categories,
-            "top_weakness": max(categories, key=categories.get) if categories else "none",
+            "categories": dict(categories),
+            "top_weakness": top[0][0] if top else "none",
             "analyses": [
                 {"scenario": a.scenario_id, "type": a.failure_type, "cause": a.root_cause}
                 for a in analyses
@@ -0,0 +1,106 @@
+"""Semantic response cache — near-duplicate prompts reuse a stored LLM response."""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any
+
+import numpy as np
+
+
+class SemanticCache:
+    """Embedding-keyed cache of LLM responses with cosine-similarity lookup.
+
+    Prompts are embedded with a sentence-transformers model; a lookup hits when
+    the best stored prompt has cosine similarity >= ``threshold`` and is younger
+    than ``ttl_seconds``. Requires the optional ``sentence-transformers`` package
+    (``pip install 'agentforge[cache]'``).
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        threshold: float = 0.95,
+        ttl_seconds: float = 7 * 24 * 3600,
+        model_name: str = "all-MiniLM-L6-v2",
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.model_name = model_name
+        self._encoder: Any = None
+        self._embeddings: list[np.ndarray] = []
+        self._responses: list[str] = []
+        self._timestamps: list[float] = []
+        # Embeddings computed by a missed lookup, reused by the following add().
+        self._pending: dict[str, np.ndarray] = {}
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _embed(self, text: str) -> np.ndarray:
+        if self._encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "SemanticCache requires sentence-transformers: "
+                    "pip install 'agentforge[cache]'"
+                ) from e
+            self._encoder = SentenceTransformer(self.model_name)
+        embedding = self._encoder.encode(text, normalize_embeddings=True)
+        return np.asarray(embedding, dtype=np.float32)
+
+    def lookup(self, prompt: str) -> str | None:
+        embedding = self._embed(prompt)
+        if self._embeddings:
+            # Embeddings are unit-normalised, so the inner product is the cosine.
+            sims = np.stack(self._embeddings) @ embedding
+            expired = np.asarray(self._timestamps) < time.time() - self.ttl_seconds
+            sims[expired] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                return self._responses[best]
+        self._pending[prompt] = embedding
+        return None
+
+    def add(self, prompt: str, response: str):
+        embedding = self._pending.pop(prompt, None)
+        if embedding is None:
+            embedding = self._embed(prompt)
+        self._embeddings.append(embedding)
+        self._responses.append(response)
+        self._timestamps.append(time.time())
+
+    def save(self, path: str | None = None):
+        path = path or self.path
+        if not path:
+            return
+        self._evict_expired()
+        if not self._responses:
+            return
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                embeddings=np.stack(self._embeddings),
+                responses=np.array(self._responses, dtype=str),
+                timestamps=np.array(self._timestamps, dtype=np.float64),
+            )
+
+    def load(self, path: str | None = None):
+        path = path or self.path
+        with np.load(path) as data:
+            self._embeddings = list(data["embeddings"])
+            self._responses = [str(r) for r in data["responses"]]
+            self._timestamps = [float(t) for t in data["timestamps"]]
+        self._evict_expired()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        keep = [i for i, t in enumerate(self._timestamps) if t >= cutoff]
+        self._embeddings = [self._embeddings[i] for i in keep]
+        self._responses = [self._responses[i] for i in keep]
+        self._timestamps = [self._timestamps[i] for i in keep]
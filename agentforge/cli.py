@@ -2,13 +2,25 @@
 
 from __future__ import annotations
 
+from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import typer
-from rich.console import Console
+
+if TYPE_CHECKING:
+    from rich.console import Console
 
 app = typer.Typer(name="agentforge", help="AgentForge — Co-evolutionary agent training")
-console = Console()
+
+
+@cache
+def _console() -> Console:
+    # Built on first use so `agentforge --help` never constructs a rich Console;
+    # the model stack (torch/transformers) is likewise only imported by commands.
+    from rich.console import Console
+
+    return Console()
 
 
 @app.command()
@@ -25,6 +37,7 @@ def demo(
     from .environment import SimulationEnvironment
     from .local_agent import LocalAgent
 
+    console = _console()
     console.print(f"[bold green]AgentForge Demo[/bold green]")
     console.print(f"Model: {model}")
     console.print(f"Config: {config}\n")
@@ -53,6 +66,7 @@ def forge(
     from .environment import SimulationEnvironment
     from .local_agent import LocalAgent
 
+    console = _console()
     console.print(f"[bold green]AgentForge Co-Evolutionary Loop[/bold green]")
     console.print(f"Model: {model}")
     console.print(f"Config: {config}")
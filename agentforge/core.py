@@ -2,31 +2,112 @@
 
 from __future__ import annotations
 
-import json
+import asyncio
+import logging
 import os
 from dataclasses import dataclass, field
+from functools import singledispatch
+from pathlib import Path
 from typing import Any
 
+import numpy as np
 from rich.console import Console
 from rich.table import Table
 
 from .analyzer import FailureAnalyzer
+from .cache import SemanticCache
 from .curriculum import Curriculum
-from .environment import SimulationEnvironment
-from .generator import ScenarioGenerator
+from .environment import Scenario, SimulationEnvironment
+from .generator import GeneratedScenario, ScenarioGenerator
 from .local_agent import LocalAgent
+from .parsing import dumps
 from .rewards import compute_reward
 
 console = Console()
+logger = logging.getLogger(__name__)
+
+
+@singledispatch
+def to_sc_dict(sc: Any) -> dict[str, Any]:
+    """Normalize a scenario (dataclass, dict or duck-typed object) into the agent's dict form."""
+    return {
+        "id": getattr(sc, "id", "unknown"),
+        "user_message": getattr(sc, "user_message", ""),
+        "description": getattr(sc, "description", ""),
+        "expected_tool_calls": getattr(sc, "expected_tool_calls", []),
+        "expected_keywords": getattr(sc, "expected_keywords", []),
+    }
+
+
+@to_sc_dict.register
+def _(sc: dict) -> dict[str, Any]:
+    return {
+        "id": sc.get("id", "unknown"),
+        "user_message": sc.get("user_message", ""),
+        "description": sc.get("description", ""),
+        "expected_tool_calls": sc.get("expected_tool_calls", []),
+        "expected_keywords": sc.get("expected_keywords", []),
+    }
+
+
+@to_sc_dict.register(Scenario)
+@to_sc_dict.register(GeneratedScenario)
+def _(sc: Scenario | GeneratedScenario) -> dict[str, Any]:
+    return {
+        "id": sc.id,
+        "user_message": sc.user_message,
+        "description": sc.description,
+        "expected_tool_calls": sc.expected_tool_calls,
+        "expected_keywords": sc.expected_keywords,
+    }
+
+
+@dataclass(slots=True)
+class ResultsTable:
+    """Evaluation results stored column-wise: entry ``i`` of every column is scenario ``i``."""
+
+    scenario_ids: list[str] = field(default_factory=list)
+    passed: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    scores: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float64))
+    rewards: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float64))
+    reward_explanations: list[str] = field(default_factory=list)
+    # Traces are heterogeneous Python objects, so they stay in a plain list.
+    traces: list[Any] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.scenario_ids)
+
+    @classmethod
+    def from_rows(cls, rows: list[dict[str, Any]]) -> ResultsTable:
+        n = len(rows)
+        return cls(
+            scenario_ids=[r["scenario_id"] for r in rows],
+            passed=np.fromiter((r["passed"] for r in rows), dtype=bool, count=n),
+            scores=np.fromiter((r["score"] for r in rows), dtype=np.float64, count=n),
+            rewards=np.fromiter((r["reward"] for r in rows), dtype=np.float64, count=n),
+            reward_explanations=[r["reward_explanation"] for r in rows],
+            traces=[r["trace"] for r in rows],
+        )
+
+    def mean_score(self) -> float:
+        return float(self.scores.mean()) if len(self) else 0.0
 
 
-@dataclass
+@dataclass(slots=True)
 class ForgeRound:
     round_num: int
-    base_results: list[dict[str, Any]] = field(default_factory=list)
+    base_results: ResultsTable = field(default_factory=ResultsTable)
     failure_summary: dict[str, Any] = field(default_factory=dict)
     generated_scenarios: list[dict[str, Any]] = field(default_factory=list)
-    generated_results: list[dict[str, Any]] = field(default_factory=list)
+    generated_results: ResultsTable = field(default_factory=ResultsTable)
+
+    @property
+    def base_avg(self) -> float:
+        return self.base_results.mean_score()
+
+    @property
+    def gen_avg(self) -> float:
+        return self.generated_results.mean_score()
 
 
 class AgentForge:
@@ -37,49 +118,63 @@ class AgentForge:
         env: SimulationEnvironment,
         agent: LocalAgent | None = None,
         output_dir: str = "generated_scenarios",
+        semantic_cache: bool = False,
     ):
         self.env = env
         self.agent = agent or LocalAgent()
-        self.analyzer = FailureAnalyzer(agent=self.agent)
+        cache = (
+            SemanticCache(path=os.path.join(output_dir, "sem_cache.npz"))
+            if semantic_cache else None
+        )
+        self.analyzer = FailureAnalyzer(agent=self.agent, cache=cache)
         self.generator = ScenarioGenerator(agent=self.agent)
         self.output_dir = output_dir
         self.rounds: list[ForgeRound] = []
         os.makedirs(output_dir, exist_ok=True)
 
-    def run_evaluation(
+    async def run_evaluation(
         self, scenarios: list[Any], label: str = "base"
-    ) -> list[dict[str, Any]]:
-        results = []
+    ) -> ResultsTable:
+        """Run all scenarios concurrently; results keep the input order."""
         tools = self.env.get_tools_for_agent()
+        # Prefill the shared system prompt once, before scenarios run concurrently.
+        self.agent.prepare_tools(tools)
 
-        for sc in scenarios:
-            sc_dict = {
-                "id": sc.id if hasattr(sc, "id") else sc.get("id", "unknown"),
-                "user_message": sc.user_message if hasattr(sc, "user_message") else sc.get("user_message", ""),
-                "description": sc.description if hasattr(sc, "description") else sc.get("description", ""),
-                "expected_tool_calls": (
-                    sc.expected_tool_calls if hasattr(sc, "expected_tool_calls")
-                    else sc.get("expected_tool_calls", [])
-                ),
-            }
+        async def _run_one(sc: Any) -> dict[str, Any]:
+            sc_dict = to_sc_dict(sc)
             sc_id = sc_dict["id"]
-            console.print(f"  [{label}] Running scenario: {sc_id}...", style="dim")
 
-            trace = self.agent.run_scenario(sc_dict, tools)
+            trace = await self.agent.arun_scenario(sc_dict, tools)
             eval_result = self.env.evaluate_trace(sc, trace)
             reward = compute_reward(trace, sc_dict)
             trace.success = eval_result.passed
-
-            results.append({
+            # Per-scenario progress goes to the log as one JSON object per
+            # line; the console only gets the per-phase tables.
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "%s",
+                    dumps({
+                        "label": label,
+                        "scenario_id": sc_id,
+                        "passed": eval_result.passed,
+                        "score": eval_result.score,
+                        "reward": reward.value,
+                        "tool_calls": [tc.name for tc in trace.tool_calls],
+                        "error": trace.error,
+                    }).decode(),
+                )
+
+            return {
                 "scenario_id": sc_id,
                 "passed": eval_result.passed,
                 "score": eval_result.score,
                 "reward": reward.value,
                 "reward_explanation": reward.explanation,
                 "trace": trace,
-            })
+            }
 
-        return results
+        rows = await asyncio.gather(*(_run_one(sc) for sc in scenarios))
+        return ResultsTable.from_rows(rows)
 
     def run_round(self, round_num: int) -> ForgeRound:
         forge_round = ForgeRound(round_num=round_num)
@@ -87,13 +182,16 @@ class AgentForge:
 
         # 1. Evaluate on base scenarios
         console.print("\n[bold]Phase 1: Evaluating agent on base scenarios...[/bold]")
-        forge_round.base_results = self.run_evaluation(self.env.scenarios, label="base")
+        forge_round.base_results = asyncio.run(
+            self.run_evaluation(self.env.scenarios, label="base")
+        )
         self._print_results(forge_round.base_results, "Base Scenario Results")
 
         # 2. Analyze failures
         console.print("\n[bold]Phase 2: Analyzing failures...[/bold]")
-        traces = [r["trace"] for r in forge_round.base_results]
-        analyses = self.analyzer.analyze(traces)
+        analyses = self.analyzer.analyze(forge_round.base_results.traces)
+        if self.analyzer.cache is not None:
+            self.analyzer.cache.save()
         forge_round.failure_summary = self.analyzer.summarize(analyses)
         if forge_round.failure_summary.get("top_weakness"):
             console.print(
@@ -119,13 +217,12 @@ class AgentForge:
 
         # Save generated scenarios
         save_path = os.path.join(self.output_dir, f"round_{round_num}.json")
-        with open(save_path, "w") as f:
-            json.dump(forge_round.generated_scenarios, f, indent=2)
+        Path(save_path).write_bytes(dumps(forge_round.generated_scenarios, indent=True))
         console.print(f"  Saved generated scenarios to {save_path}")
 
         # 4. Evaluate on generated scenarios
         console.print("\n[bold]Phase 4: Evaluating agent on generated scenarios...[/bold]")
-        forge_round.generated_results = self.run_evaluation(generated, label="gen")
+        forge_round.generated_results = asyncio.run(self.run_evaluation(generated, label="gen"))
         self._print_results(forge_round.generated_results, "Generated Scenario Results")
 
         # 5. Comparison
@@ -144,32 +241,27 @@ class AgentForge:
 
         self._print_final_summary()
 
-    def _print_results(self, results: list[dict[str, Any]], title: str):
+    def _print_results(self, results: ResultsTable, title: str):
         table = Table(title=title)
         table.add_column("Scenario", style="cyan")
         table.add_column("Passed", style="green")
         table.add_column("Score", style="yellow")
         table.add_column("Reward", style="magenta")
 
-        for r in results:
-            passed = "[green]YES[/green]" if r["passed"] else "[red]NO[/red]"
+        for sc_id, passed, score, reward in zip(
+            results.scenario_ids, results.passed, results.scores, results.rewards
+        ):
             table.add_row(
-                r["scenario_id"],
-                passed,
-                f"{r['score']:.2f}",
-                f"{r['reward']:.2f}",
+                sc_id,
+                "[green]YES[/green]" if passed else "[red]NO[/red]",
+                f"{score:.2f}",
+                f"{reward:.2f}",
             )
         console.print(table)
 
     def _print_comparison(self, forge_round: ForgeRound):
-        base_avg = (
-            sum(r["score"] for r in forge_round.base_results) / len(forge_round.base_results)
-            if forge_round.base_results else 0
-        )
-        gen_avg = (
-            sum(r["score"] for r in forge_round.generated_results) / len(forge_round.generated_results)
-            if forge_round.generated_results else 0
-        )
+        base_avg = forge_round.base_avg
+        gen_avg = forge_round.gen_avg
 
         console.print(f"\n  Base avg score:      [green]{base_avg:.2f}[/green]")
         console.print(f"  Generated avg score: [red]{gen_avg:.2f}[/red]")
@@ -181,27 +273,31 @@ class AgentForge:
             console.print("  → Agent performed equally or better on generated scenarios")
 
     def _print_final_summary(self):
+        # Imported here so numba (when installed) is only loaded, and its
+        # cached kernels read from disk, once a summary is actually printed.
+        from ._fastpath import round_stats
+
         console.rule("[bold green]Final Summary")
         table = Table(title="Performance Across Rounds")
         table.add_column("Round", style="cyan")
         table.add_column("Base Avg", style="green")
+        table.add_column("Base Pass", style="green")
         table.add_column("Gen Avg", style="red")
+        table.add_column("Gen Pass", style="red")
         table.add_column("Top Weakness", style="yellow")
 
         for r in self.rounds:
-            base_avg = (
-                sum(res["score"] for res in r.base_results) / len(r.base_results)
-                if r.base_results else 0
-            )
-            gen_avg = (
-                sum(res["score"] for res in r.generated_results) / len(r.generated_results)
-                if r.generated_results else 0
+            base_avg, base_pass = round_stats(r.base_results.scores, r.base_results.passed)
+            gen_avg, gen_pass = round_stats(
+                r.generated_results.scores, r.generated_results.passed
             )
             weakness = r.failure_summary.get("top_weakness", "n/a")
             table.add_row(
                 str(r.round_num),
                 f"{base_avg:.2f}",
+                f"{base_pass:.0%}",
                 f"{gen_avg:.2f}",
+                f"{gen_pass:.0%}",
                 weakness,
             )
         console.print(table)
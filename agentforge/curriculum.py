@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Any
 
@@ -9,7 +10,7 @@ from typing import Any
 DIFFICULTY_ORDER = {"easy": 0, "medium": 1, "hard": 2}
 
 
-@dataclass
+@dataclass(slots=True)
 class CurriculumStage:
     name: str
     difficulty: str
@@ -26,21 +27,15 @@ class Curriculum:
         self.history: list[dict[str, Any]] = []
 
     def build_from_scenarios(self, scenarios: list[dict[str, Any]]):
-        by_difficulty: dict[str, list[str]] = {"easy": [], "medium": [], "hard": []}
+        buckets: defaultdict[str, list[str]] = defaultdict(list)
         for sc in scenarios:
-            diff = sc.get("difficulty", "medium")
-            sid = sc.get("id", "unknown")
-            by_difficulty.setdefault(diff, []).append(sid)
-
-        for diff in ["easy", "medium", "hard"]:
-            if by_difficulty.get(diff):
-                self.stages.append(
-                    CurriculumStage(
-                        name=f"Stage: {diff}",
-                        difficulty=diff,
-                        scenario_ids=by_difficulty[diff],
-                    )
-                )
+            buckets[sc.get("difficulty", "medium")].append(sc.get("id", "unknown"))
+
+        self.stages.extend(
+            CurriculumStage(name=f"Stage: {diff}", difficulty=diff, scenario_ids=buckets[diff])
+            for diff in sorted(DIFFICULTY_ORDER, key=DIFFICULTY_ORDER.__getitem__)
+            if diff in buckets
+        )
 
     @property
     def current_stage(self) -> CurriculumStage | None:
@@ -3,13 +3,23 @@
 from __future__ import annotations
 
 import json
+from collections.abc import Mapping
 from dataclasses import dataclass, field
+from functools import cached_property
+from types import MappingProxyType
 from typing import Any, Callable
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
 
-@dataclass
+from .parsing import dumps
+
+
+@dataclass(slots=True)
 class Tool:
     name: str
     description: str
@@ -17,7 +27,7 @@ class Tool:
     function: Callable[..., Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class Scenario:
     id: str
     description: str
@@ -28,9 +38,10 @@ class Scenario:
     success_criteria: list[str] = field(default_factory=list)
     expected_tool_calls: list[str] = field(default_factory=list)
     expected_outcome: str = ""
+    expected_keywords: list[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class EvalResult:
     scenario_id: str
     passed: bool
@@ -50,7 +61,7 @@ class SimulationEnvironment:
 
     def load_config(self, config_path: str):
         with open(config_path) as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=SafeLoader)
 
         for tool_cfg in config.get("tools", []):
             name = tool_cfg["name"]
@@ -73,30 +84,55 @@ class SimulationEnvironment:
                     success_criteria=sc.get("success_criteria", []),
                     expected_tool_calls=sc.get("expected_tool_calls", []),
                     expected_outcome=sc.get("expected_outcome", ""),
+                    expected_keywords=sc.get("expected_keywords", []),
                 )
             )
 
+        # The tool set changed; rebuild the cached agent view on next access.
+        self.__dict__.pop("tools_for_agent", None)
+
     def _make_mock_function(
         self, tool_name: str, mock_responses: dict[str, Any]
     ) -> Callable[..., Any]:
+        # Mock response keys are JSON-encoded kwargs; re-encode them once here in
+        # the canonical (sorted-key, orjson) form that each call produces.
+        precomputed: dict[bytes, Any] = {}
+        for key, response in mock_responses.items():
+            if key == "default":
+                continue
+            try:
+                precomputed[dumps(json.loads(key), sort_keys=True)] = response
+            except (json.JSONDecodeError, TypeError):
+                continue
+        has_default = "default" in mock_responses
+        default = mock_responses.get("default")
+
         def mock_fn(**kwargs) -> Any:
-            key = json.dumps(kwargs, sort_keys=True)
-            if key in mock_responses:
-                return mock_responses[key]
-            if "default" in mock_responses:
-                return mock_responses["default"]
+            try:
+                key = dumps(kwargs, sort_keys=True)
+            except TypeError:  # arguments that are not JSON-serializable
+                key = None
+            if key in precomputed:
+                return precomputed[key]
+            if has_default:
+                return default
             return {"status": "ok", "tool": tool_name, "input": kwargs}
         return mock_fn
 
-    def get_tools_for_agent(self) -> dict[str, Any]:
-        result = {}
-        for name, tool in self.tools.items():
-            result[name] = {
+    @cached_property
+    def tools_for_agent(self) -> Mapping[str, Mapping[str, Any]]:
+        """Read-only tool specs for the agent, built once per loaded config."""
+        return MappingProxyType({
+            name: MappingProxyType({
                 "description": tool.description,
                 "parameters": tool.parameters,
                 "function": tool.function,
-            }
-        return result
+            })
+            for name, tool in self.tools.items()
+        })
+
+    def get_tools_for_agent(self) -> Mapping[str, Mapping[str, Any]]:
+        return self.tools_for_agent
 
     def evaluate_trace(self, scenario: Scenario, trace: Any) -> EvalResult:
         score = 0.0
@@ -105,7 +141,8 @@ class SimulationEnvironment:
         # Check tool calls
         if scenario.expected_tool_calls:
             called_tools = [tc.name for tc in trace.tool_calls]
-            matched = sum(1 for t in scenario.expected_tool_calls if t in called_tools)
+            called_set = frozenset(called_tools)
+            matched = sum(1 for t in scenario.expected_tool_calls if t in called_set)
             tool_score = matched / len(scenario.expected_tool_calls)
             score += tool_score * 0.5
             details["tool_call_score"] = tool_score
@@ -2,15 +2,29 @@
 
 from __future__ import annotations
 
-import json
-import re
 from dataclasses import dataclass, field
 from typing import Any
 
 from .local_agent import LocalAgent
+from .parsing import extract_first_json
 
+# Invariant instructions; together with the per-round tool list they form the
+# leading system message, so its KV cache can be prefilled once and reused.
+GENERATION_PROMPT_PREFIX = (
+    "Generate a NEW test scenario for an AI agent. "
+    "The new scenario should be HARDER than existing ones.\n"
+    "Respond with JSON:\n"
+    "{\n"
+    '  "description": "A brief description of the scenario",\n'
+    '  "user_message": "What the user says to the agent",\n'
+    '  "difficulty": "medium or hard",\n'
+    '  "expected_tool_calls": ["tool1", "tool2"],\n'
+    '  "success_criteria": ["criterion1", "criterion2"]\n'
+    "}"
+)
 
-@dataclass
+
+@dataclass(slots=True)
 class GeneratedScenario:
     id: str
     description: str
@@ -20,6 +34,7 @@ class GeneratedScenario:
     initial_state: dict[str, Any] = field(default_factory=dict)
     success_criteria: list[str] = field(default_factory=list)
     expected_tool_calls: list[str] = field(default_factory=list)
+    expected_keywords: list[str] = field(default_factory=list)
 
 
 class ScenarioGenerator:
@@ -36,59 +51,49 @@ class ScenarioGenerator:
         available_tools: list[str],
         num_scenarios: int = 3,
     ) -> list[GeneratedScenario]:
-        scenarios = []
         top_weakness = failure_summary.get("top_weakness", "reasoning")
+        messages = [
+            {"role": "system", "content": self._build_prefix(available_tools)},
+            {"role": "user", "content": self._build_prompt(top_weakness, existing_scenarios)},
+        ]
+
+        # Every scenario shares the same prompt; sampling diversifies the outputs.
+        responses = self.agent.generate_batch(
+            [messages for _ in range(num_scenarios)], cache_prefix=True
+        )
+        return [
+            self._parse_scenario(response, top_weakness, available_tools, index=i)
+            for i, response in enumerate(responses)
+        ]
+
+    def _build_prefix(self, available_tools: list[str]) -> str:
+        return f"{GENERATION_PROMPT_PREFIX}\n\nAvailable tools: {', '.join(available_tools)}"
 
-        for i in range(num_scenarios):
-            scenario = self._generate_single(
-                weakness=top_weakness,
-                existing_scenarios=existing_scenarios,
-                available_tools=available_tools,
-                index=i,
-            )
-            scenarios.append(scenario)
-        return scenarios
-
-    def _generate_single(
+    def _build_prompt(
         self,
         weakness: str,
         existing_scenarios: list[dict[str, Any]],
-        available_tools: list[str],
-        index: int,
-    ) -> GeneratedScenario:
-        self._generated_count += 1
+    ) -> str:
         existing_desc = "\n".join(
             f"- {s.get('description', s.get('id', 'unknown'))}"
             for s in existing_scenarios[:5]
         )
 
-        prompt = (
-            "Generate a NEW test scenario for an AI agent. The scenario should target "
-            f"this weakness: {weakness}\n\n"
-            f"Available tools: {', '.join(available_tools)}\n\n"
-            f"Existing scenarios (avoid duplicating these):\n{existing_desc}\n\n"
-            "The new scenario should be HARDER than existing ones.\n"
-            "Respond with JSON:\n"
-            "{\n"
-            '  "description": "A brief description of the scenario",\n'
-            '  "user_message": "What the user says to the agent",\n'
-            '  "difficulty": "medium or hard",\n'
-            '  "expected_tool_calls": ["tool1", "tool2"],\n'
-            '  "success_criteria": ["criterion1", "criterion2"]\n'
-            "}"
+        return (
+            f"The scenario should target this weakness: {weakness}\n\n"
+            f"Existing scenarios (avoid duplicating these):\n{existing_desc}"
         )
 
-        messages = [{"role": "user", "content": prompt}]
-        response = self.agent.generate(messages)
-
-        try:
-            # Try to find JSON in the response
-            match = re.search(r"\{.*\}", response, re.DOTALL)
-            if match:
-                parsed = json.loads(match.group(0))
-            else:
-                parsed = json.loads(response)
-        except json.JSONDecodeError:
+    def _parse_scenario(
+        self,
+        response: str,
+        weakness: str,
+        available_tools: list[str],
+        index: int,
+    ) -> GeneratedScenario:
+        self._generated_count += 1
+        parsed = extract_first_json(response)
+        if parsed is None:
             parsed = {
                 "description": f"Generated scenario targeting {weakness}",
                 "user_message": f"Please help me with a complex {weakness} task",
@@ -106,4 +111,5 @@ class ScenarioGenerator:
             initial_state=parsed.get("initial_state", {}),
             success_criteria=parsed.get("success_criteria", []),
             expected_tool_calls=parsed.get("expected_tool_calls", []),
+            expected_keywords=parsed.get("expected_keywords", []),
         )
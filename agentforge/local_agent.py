@@ -2,22 +2,34 @@
 
 from __future__ import annotations
 
-import json
-import re
+import asyncio
+import copy
+import functools
+import threading
 from dataclasses import dataclass, field
-from typing import Any
+from typing import TYPE_CHECKING, Any, Literal
 
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from .parsing import dumps, extract_first_json
 
+if TYPE_CHECKING:
+    import torch
 
-@dataclass
+_DIRECT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful agent. Answer the user's request directly in plain text.",
+}
+
+# torch and transformers take seconds to import, so they are imported where the
+# model is first needed; traces, parsing and prompt formatting don't pay for them.
+
+
+@dataclass(slots=True)
 class ToolCall:
     name: str
     arguments: dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentTrace:
     scenario_id: str
     messages: list[dict[str, str]] = field(default_factory=list)
@@ -27,77 +39,480 @@ class AgentTrace:
     error: str | None = None
 
 
+@dataclass(slots=True)
+class _Conversation:
+    """Per-scenario prompt state carried between the turns of run_scenario."""
+
+    text: str = ""
+    input_ids: torch.Tensor | None = None
+    # KV cache left by the previous generate() and the token ids it covers.
+    past_key_values: Any = None
+    past_ids: torch.Tensor | None = None
+
+
+def _common_prefix_len(a: torch.Tensor, b: torch.Tensor) -> int:
+    n = min(a.shape[-1], b.shape[-1])
+    mismatch = (a[0, :n] != b[0, :n]).nonzero()
+    return int(mismatch[0, 0]) if mismatch.numel() else n
+
+
+class _JsonObjectStop:
+    """Stop once the generated text holds a complete tool call or final answer.
+
+    A plain ``stop_strings=["}"]`` would fire on the first nested close, e.g.
+    the end of ``"args": {...}``, so the reply is parsed with the brace scan
+    instead. Only an object carrying the protocol keys counts: while the outer
+    object is still open, the scan may already find a balanced inner ``args``.
+    Implements the ``StoppingCriteria`` call protocol without subclassing it,
+    so defining it does not import transformers.
+    """
+
+    def __init__(self, tokenizer: Any, prompt_len: int):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_len:], skip_special_tokens=True)
+        return input_ids.new_tensor([_is_reply_object(text) for text in texts]).bool()
+
+
+def _is_reply_object(text: str) -> bool:
+    parsed = extract_first_json(text)
+    return isinstance(parsed, dict) and ("tool" in parsed or "final_answer" in parsed)
+
+
+def _pad_to_bucket(
+    input_ids: torch.Tensor, attention_mask: torch.Tensor, pad_token_id: int
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Left-pad to the next power of two so static-cache shapes repeat across calls."""
+    import torch.nn.functional as F
+
+    length = input_ids.shape[-1]
+    pad = (1 << (length - 1).bit_length()) - length
+    if pad == 0:
+        return input_ids, attention_mask
+    return (
+        F.pad(input_ids, (pad, 0), value=pad_token_id),
+        F.pad(attention_mask, (pad, 0), value=0),
+    )
+
+
+def _default_dtype() -> torch.dtype:
+    """Half precision on CUDA (bf16 where supported), fp32 elsewhere."""
+    import torch
+
+    if torch.cuda.is_available():
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    return torch.float32
+
+
+def _flash_available() -> bool:
+    """flash-attn is installed and the GPU is Ampere (compute capability 8.0) or newer."""
+    import importlib.util
+
+    import torch
+
+    if importlib.util.find_spec("flash_attn") is None or not torch.cuda.is_available():
+        return False
+    return torch.cuda.get_device_capability() >= (8, 0)
+
+
+def _quantization_config(quantization: str, compute_dtype: torch.dtype | str) -> Any:
+    """BitsAndBytesConfig for ``quantization``, or None for full-precision weights."""
+    if quantization == "none":
+        return None
+    if quantization not in ("int8", "nf4"):
+        raise ValueError(f"Unknown quantization {quantization!r}; expected 'none', 'int8' or 'nf4'")
+    from transformers import BitsAndBytesConfig
+
+    if quantization == "int8":
+        return BitsAndBytesConfig(load_in_8bit=True)
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=compute_dtype,
+    )
+
+
+def _compile_supported() -> bool:
+    """torch.compile is usable for HF decoder forwards from torch 2.1 on."""
+    import torch
+
+    major, minor = (int(p) for p in torch.__version__.split("+")[0].split(".")[:2])
+    return (major, minor) >= (2, 1)
+
+
+# Guards _load_shared_model, whose lru_cache alone would let two threads load the same weights.
+_LOAD_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=2)
+def _load_shared_model(
+    model_name: str,
+    dtype: torch.dtype | str,
+    quantization: str,
+    compile_model: bool | None,
+    static_cache: bool,
+) -> tuple[Any, Any]:
+    """Load ``(tokenizer, model)`` once per process for each configuration.
+
+    Every LocalAgent with the same settings shares the weights; their prefix
+    caches and conversations stay per agent.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    # Decoder-only models continue from the right edge, so batched
+    # prompts must be padded on the left.
+    tokenizer.padding_side = "left"
+    # FlashAttention-2 only runs in half precision; SDPA covers the rest.
+    half = dtype in (torch.float16, torch.bfloat16, "float16", "bfloat16")
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=dtype,
+        attn_implementation="flash_attention_2" if half and _flash_available() else "sdpa",
+        device_map="auto",
+        quantization_config=_quantization_config(quantization, dtype),
+    )
+    if compile_model is None:
+        # Only the static cache gives the fixed shapes CUDA graphs need.
+        # bitsandbytes kernels break the graph at every linear layer.
+        compile_model = static_cache and torch.cuda.is_available() and quantization == "none"
+    if compile_model and _compile_supported():
+        if static_cache:
+            # Fixed cache and bucketed prompt shapes: capture the whole decode
+            # step as one CUDA graph.
+            model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=True)
+        else:
+            # No CUDA graphs: with a DynamicCache the KV length changes every
+            # step, so each step would record a new graph. The KV tensors kept
+            # across calls (prefix cache, conversations) would also sit in the
+            # graph pool, where later replays overwrite them. dynamic=True
+            # avoids recompiling as the sequence grows.
+            model.forward = torch.compile(model.forward, mode="default", dynamic=True)
+    return tokenizer, model
+
+
 class LocalAgent:
-    """Agent that uses a local HuggingFace model for inference."""
+    """Agent that uses a local HuggingFace model for inference.
+
+    Turns that follow the JSON tool protocol decode greedily, so ``temperature``
+    only applies to final turns: the last turn of run_scenario, or every turn
+    when no tools are in use.
+    """
 
     def __init__(
         self,
         model_name: str = "Qwen/Qwen2.5-0.5B-Instruct",
         max_new_tokens: int = 512,
         temperature: float = 0.7,
+        dtype: torch.dtype | str | None = None,
+        compile_model: bool | None = None,
+        tool_max_new_tokens: int | None = None,
+        quantization: Literal["none", "int8", "nf4"] = "none",
+        static_cache: bool = False,
+        tool_mode: bool = True,
     ):
         self.model_name = model_name
         self.max_new_tokens = max_new_tokens
+        # Optional lower token budget for tool-protocol turns; None uses
+        # max_new_tokens. Those turns already stop at the reply's closing brace,
+        # so a lower cap only truncates long calls or answers.
+        self.tool_max_new_tokens = tool_max_new_tokens
         self.temperature = temperature
+        # None picks per device at load time. Outputs are decoded to text, so
+        # parsing and rewards do not depend on the precision.
+        self.dtype = dtype
+        # bitsandbytes weight quantization (pip install 'agentforge[quant]', CUDA
+        # only). It trades a little accuracy for less memory moved per decode step.
+        self.quantization = quantization
+        # None compiles only with static_cache on CUDA, where CUDA graphs pay
+        # for the compile time. True without static_cache compiles with kernel
+        # fusion but no CUDA graphs.
+        self.compile_model = compile_model
+        # Decode into a preallocated StaticCache so compiled steps can be CUDA
+        # graphs. The prefilled DynamicCaches (shared prefix, previous turn)
+        # cannot seed a StaticCache, so this trades their reuse for fixed shapes.
+        self.static_cache = static_cache
+        # False (or an empty tool set) prompts for a plain-text answer instead
+        # of the JSON tool protocol, and the reply is taken as-is.
+        self.tool_mode = tool_mode
         self._model = None
         self._tokenizer = None
+        # Rendered prompt prefix -> (input_ids, past_key_values) after prefill.
+        self._prefix_caches: dict[str, tuple[torch.Tensor, Any]] = {}
+        # id(tools) -> (tools, system message). The tools object is kept so its
+        # id cannot be reused by another mapping while the entry is alive.
+        self._system_msg_cache: dict[int, tuple[Any, dict[str, str]]] = {}
 
     def _load_model(self):
-        if self._model is None:
-            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self._model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float32,
-                device_map="auto",
-            )
-            if self._tokenizer.pad_token is None:
-                self._tokenizer.pad_token = self._tokenizer.eos_token
+        if self._model is not None:
+            return
+        # Scenarios may run concurrently in worker threads; load the weights once.
+        with _LOAD_LOCK:
+            if self._model is None:
+                tokenizer, model = _load_shared_model(
+                    self.model_name,
+                    self.dtype or _default_dtype(),
+                    self.quantization,
+                    self.compile_model,
+                    self.static_cache,
+                )
+                self._tokenizer = tokenizer
+                # Publish the model last: other threads only check _model.
+                self._model = model
+
+    def generate(
+        self,
+        messages: list[dict[str, str]],
+        cache_prefix: bool = False,
+        conversation: _Conversation | None = None,
+        kind: Literal["tool", "final"] = "final",
+    ) -> str:
+        """Generate a response to ``messages``.
+
+        ``cache_prefix`` reuses the prefilled KV cache of the leading message.
+        ``conversation`` carries the previous turn's token ids and KV cache, so
+        only the text appended since then is tokenized and prefilled.
+        ``kind="tool"`` decodes greedily and stops at the end of the reply's
+        JSON object; ``"final"`` samples with ``temperature``.
+        """
+        import torch
 
-    def generate(self, messages: list[dict[str, str]]) -> str:
         self._load_model()
         text = self._tokenizer.apply_chat_template(
             messages, tokenize=False, add_generation_prompt=True
         )
-        inputs = self._tokenizer(text, return_tensors="pt").to(self._model.device)
+        prefix_ids = prefix_past = None
+        if cache_prefix and not self.static_cache:
+            prefix_text = self._tokenizer.apply_chat_template(messages[:1], tokenize=False)
+            if text.startswith(prefix_text):
+                prefix_ids, prefix_past = self._get_prefix_cache(prefix_text)
+
+        resume = (
+            conversation is not None
+            and conversation.input_ids is not None
+            and text.startswith(conversation.text)
+        )
+        if resume:
+            # Only the messages appended since the previous turn need tokenizing.
+            tail = self._tokenize_tail(text[len(conversation.text):])
+            input_ids = torch.cat([conversation.input_ids, tail], dim=-1)
+        elif prefix_ids is not None:
+            tail = self._tokenize_tail(text[len(prefix_text):])
+            input_ids = torch.cat([prefix_ids, tail], dim=-1)
+        else:
+            input_ids = self._tokenizer(text, return_tensors="pt")["input_ids"].to(self._model.device)
+        if conversation is not None:
+            conversation.text = text
+            conversation.input_ids = input_ids
+
+        # With static_cache neither a prefix nor a previous-turn cache exists here.
+        past = None
+        if conversation is not None and conversation.past_key_values is not None:
+            # Reuse the previous turn's KV cache for the tokens the new prompt
+            # still shares with it; generate() then prefills only the rest.
+            past = conversation.past_key_values
+            keep = min(
+                _common_prefix_len(conversation.past_ids, input_ids), input_ids.shape[-1] - 1
+            )
+            if keep <= 0:
+                past = None
+            elif past.get_seq_length() > keep:
+                past.crop(keep - past.get_seq_length())
+        elif prefix_ids is not None and torch.equal(input_ids[:, : prefix_ids.shape[-1]], prefix_ids):
+            # generate() appends to the cache in place, so hand it a private copy.
+            past = copy.deepcopy(prefix_past)
+        if conversation is not None:
+            # Dropped until this turn succeeds: a failed generate() may leave it half-updated.
+            conversation.past_key_values = conversation.past_ids = None
+
+        attention_mask = torch.ones_like(input_ids)
+        if self.static_cache:
+            input_ids, attention_mask = _pad_to_bucket(
+                input_ids, attention_mask, self._tokenizer.pad_token_id
+            )
+        with torch.no_grad():
+            outputs = self._model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past,
+                use_cache=True,
+                return_dict_in_generate=True,
+                pad_token_id=self._tokenizer.pad_token_id,
+                **self._decoding_kwargs(kind, input_ids.shape[-1]),
+            )
+        sequences = outputs.sequences
+        if conversation is not None and not self.static_cache:
+            conversation.past_key_values = outputs.past_key_values
+            conversation.past_ids = sequences[:, : outputs.past_key_values.get_seq_length()]
+        # One host copy of just the new ids; decode() would otherwise convert
+        # the tensor slice itself.
+        new_ids = sequences[0, input_ids.shape[-1]:].tolist()
+        return self._tokenizer.decode(new_ids, skip_special_tokens=True)
+
+    def _decoding_kwargs(self, kind: Literal["tool", "final"], prompt_len: int) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {"cache_implementation": "static"} if self.static_cache else {}
+        if kind == "tool":
+            from transformers import StoppingCriteriaList
+
+            return kwargs | {
+                "max_new_tokens": (
+                    self.max_new_tokens
+                    if self.tool_max_new_tokens is None
+                    else min(self.max_new_tokens, self.tool_max_new_tokens)
+                ),
+                # Cleared so the model's sampling defaults don't warn under greedy search.
+                "do_sample": False,
+                "temperature": None,
+                "top_p": None,
+                "top_k": None,
+                "stopping_criteria": StoppingCriteriaList(
+                    [_JsonObjectStop(self._tokenizer, prompt_len)]
+                ),
+            }
+        return kwargs | {
+            "max_new_tokens": self.max_new_tokens,
+            "temperature": self.temperature,
+            "do_sample": True,
+            "top_p": 0.9,
+        }
+
+    def _tokenize_tail(self, text: str) -> torch.Tensor:
+        """Token ids for text that continues an already-tokenized prompt."""
+        return self._tokenizer(text, return_tensors="pt", add_special_tokens=False)[
+            "input_ids"
+        ].to(self._model.device)
+
+    def generate_batch(
+        self,
+        messages_list: list[list[dict[str, str]]],
+        cache_prefix: bool = False,
+        kind: Literal["tool", "final"] = "final",
+    ) -> list[str]:
+        """Generate one response per conversation in a single batched forward pass.
+
+        With ``cache_prefix=True`` every conversation must open with the same
+        message; its KV cache is prefilled once and reused across calls.
+        ``kind`` selects the decoding settings as in :meth:`generate`.
+        """
+        if not messages_list:
+            return []
+        import torch
+
+        self._load_model()
+        texts = [
+            self._tokenizer.apply_chat_template(
+                messages, tokenize=False, add_generation_prompt=True
+            )
+            for messages in messages_list
+        ]
+
+        if cache_prefix and not self.static_cache:
+            prefix_text = self._tokenizer.apply_chat_template(
+                messages_list[0][:1], tokenize=False
+            )
+            if all(text.startswith(prefix_text) for text in texts):
+                return self._generate_batch_with_prefix(
+                    prefix_text, [text[len(prefix_text):] for text in texts], kind
+                )
+
+        inputs = self._tokenizer(texts, return_tensors="pt", padding=True).to(self._model.device)
+        if self.static_cache:
+            inputs["input_ids"], inputs["attention_mask"] = _pad_to_bucket(
+                inputs["input_ids"], inputs["attention_mask"], self._tokenizer.pad_token_id
+            )
+        prompt_len = inputs["input_ids"].shape[-1]
         with torch.no_grad():
             outputs = self._model.generate(
                 **inputs,
-                max_new_tokens=self.max_new_tokens,
-                temperature=self.temperature,
-                do_sample=True,
-                top_p=0.9,
+                num_return_sequences=1,
                 pad_token_id=self._tokenizer.pad_token_id,
+                **self._decoding_kwargs(kind, prompt_len),
             )
-        new_tokens = outputs[0][inputs["input_ids"].shape[-1]:]
-        return self._tokenizer.decode(new_tokens, skip_special_tokens=True)
+        return self._tokenizer.batch_decode(outputs[:, prompt_len:].tolist(), skip_special_tokens=True)
+
+    def _get_prefix_cache(self, prefix_text: str) -> tuple[torch.Tensor, Any]:
+        cached = self._prefix_caches.get(prefix_text)
+        if cached is None:
+            import torch
+
+            prefix_ids = self._tokenizer(prefix_text, return_tensors="pt")["input_ids"]
+            prefix_ids = prefix_ids.to(self._model.device)
+            with torch.no_grad():
+                past = self._model(input_ids=prefix_ids, use_cache=True).past_key_values
+            cached = (prefix_ids, past)
+            self._prefix_caches[prefix_text] = cached
+        return cached
+
+    def _generate_batch_with_prefix(
+        self, prefix_text: str, suffixes: list[str], kind: Literal["tool", "final"]
+    ) -> list[str]:
+        import torch
+
+        prefix_ids, prefix_past = self._get_prefix_cache(prefix_text)
+        suffix = self._tokenizer(
+            suffixes, return_tensors="pt", padding=True, add_special_tokens=False
+        ).to(self._model.device)
+        batch_size = len(suffixes)
+
+        # The padding sits between the shared prefix and each suffix; generate
+        # derives position ids from the attention mask, so positions stay correct.
+        input_ids = torch.cat([prefix_ids.expand(batch_size, -1), suffix["input_ids"]], dim=-1)
+        attention_mask = torch.cat(
+            [torch.ones_like(prefix_ids).expand(batch_size, -1), suffix["attention_mask"]], dim=-1
+        )
+        # generate() appends to the cache in place, so hand it a private copy.
+        past = copy.deepcopy(prefix_past)
+        if batch_size > 1:
+            past.batch_repeat_interleave(batch_size)
+
+        prompt_len = input_ids.shape[-1]
+        with torch.no_grad():
+            outputs = self._model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past,
+                pad_token_id=self._tokenizer.pad_token_id,
+                **self._decoding_kwargs(kind, prompt_len),
+            )
+        return self._tokenizer.batch_decode(outputs[:, prompt_len:].tolist(), skip_special_tokens=True)
 
     def run_scenario(
         self,
         scenario: dict[str, Any],
         tools: dict[str, Any],
         max_turns: int = 5,
+        first_response: str | None = None,
     ) -> AgentTrace:
-        trace = AgentTrace(scenario_id=scenario.get("id", "unknown"))
+        """Run ``scenario`` to a final answer or ``max_turns``.
 
-        tools_description = self._format_tools(tools)
-        system_msg = (
-            f"You are a helpful agent. You have these tools:\n\n{tools_description}\n\n"
-            "To call a tool, respond with JSON: {\"tool\": \"tool_name\", \"args\": {\"key\": \"value\"}}\n"
-            "When you have a final answer, respond with: {\"final_answer\": \"your answer\"}\n"
-            "Always respond with valid JSON only."
-        )
+        ``first_response``, when given, stands in for the first generated turn
+        (see :meth:`run_scenarios`).
+        """
+        trace = AgentTrace(scenario_id=scenario.get("id", "unknown"))
 
-        messages = [{"role": "system", "content": system_msg}]
-        user_msg = scenario.get("user_message", scenario.get("description", ""))
+        conversation = _Conversation()
+        messages = [self._system_message(tools)]
+        user_msg = self._user_message(scenario)
         messages.append({"role": "user", "content": user_msg})
         trace.messages.append({"role": "user", "content": user_msg})
 
         for turn in range(max_turns):
+            kind = self._turn_kind(tools, turn, max_turns)
             try:
-                response = self.generate(messages)
+                if turn == 0 and first_response is not None:
+                    response = first_response
+                else:
+                    response = self.generate(
+                        messages, cache_prefix=True, conversation=conversation, kind=kind
+                    )
                 trace.messages.append({"role": "assistant", "content": response})
 
-                parsed = self._parse_response(response)
+                parsed = self._parse_response(response, expect_json=self._uses_tools(tools))
 
                 if parsed.get("final_answer"):
                     trace.final_response = parsed["final_answer"]
@@ -111,7 +526,7 @@ class LocalAgent:
                     if tool_name in tools:
                         tool_fn = tools[tool_name]["function"]
                         result = tool_fn(**tool_args)
-                        tool_result = json.dumps(result) if not isinstance(result, str) else result
+                        tool_result = dumps(result).decode() if not isinstance(result, str) else result
                     else:
                         tool_result = f"Error: Unknown tool '{tool_name}'"
 
@@ -128,6 +543,82 @@ class LocalAgent:
 
         return trace
 
+    def run_scenarios(
+        self,
+        scenarios: list[dict[str, Any]],
+        tools: dict[str, Any],
+        max_turns: int = 5,
+    ) -> list[AgentTrace]:
+        """Run several scenarios, generating all their first turns in one batch.
+
+        Later turns depend on each scenario's tool results, so every scenario
+        then continues on its own through :meth:`run_scenario`.
+        """
+        if not scenarios:
+            return []
+        system = self._system_message(tools)
+        first_responses = self.generate_batch(
+            [[system, {"role": "user", "content": self._user_message(sc)}] for sc in scenarios],
+            cache_prefix=True,
+            kind=self._turn_kind(tools, 0, max_turns),
+        )
+        return [
+            self.run_scenario(sc, tools, max_turns, first_response=response)
+            for sc, response in zip(scenarios, first_responses)
+        ]
+
+    async def arun_scenario(
+        self,
+        scenario: dict[str, Any],
+        tools: dict[str, Any],
+        max_turns: int = 5,
+    ) -> AgentTrace:
+        """Run a scenario in a worker thread so several can be awaited concurrently."""
+        return await asyncio.to_thread(self.run_scenario, scenario, tools, max_turns)
+
+    def prepare_tools(self, tools: dict[str, Any]):
+        """Tokenize and prefill the system prompt for ``tools`` ahead of a batch of scenarios.
+
+        run_scenario reuses the cached KV for that prompt on every turn, so
+        concurrent scenarios sharing a tool set skip its prefill entirely.
+        """
+        self._load_model()
+        if self.static_cache:
+            return
+        prefix_text = self._tokenizer.apply_chat_template(
+            [self._system_message(tools)], tokenize=False
+        )
+        self._get_prefix_cache(prefix_text)
+
+    @staticmethod
+    def _user_message(scenario: dict[str, Any]) -> str:
+        return scenario.get("user_message", scenario.get("description", ""))
+
+    def _uses_tools(self, tools: dict[str, Any]) -> bool:
+        return self.tool_mode and bool(tools)
+
+    def _turn_kind(self, tools: dict[str, Any], turn: int, max_turns: int) -> Literal["tool", "final"]:
+        # A tool called on the last turn never gets its result read back, so
+        # that turn is decoded as the final answer.
+        return "tool" if self._uses_tools(tools) and turn < max_turns - 1 else "final"
+
+    def _system_message(self, tools: dict[str, Any]) -> dict[str, str]:
+        if not self._uses_tools(tools):
+            return _DIRECT_SYSTEM_MESSAGE
+        cached = self._system_msg_cache.get(id(tools))
+        if cached is not None and cached[0] is tools:
+            return cached[1]
+        tools_description = self._format_tools(tools)
+        system_msg = (
+            f"You are a helpful agent. You have these tools:\n\n{tools_description}\n\n"
+            "To call a tool, respond with JSON: {\"tool\": \"tool_name\", \"args\": {\"key\": \"value\"}}\n"
+            "When you have a final answer, respond with: {\"final_answer\": \"your answer\"}\n"
+            "Always respond with valid JSON only."
+        )
+        message = {"role": "system", "content": system_msg}
+        self._system_msg_cache[id(tools)] = (tools, message)
+        return message
+
     def _format_tools(self, tools: dict[str, Any]) -> str:
         lines = []
         for name, spec in tools.items():
@@ -137,25 +628,13 @@ class LocalAgent:
             lines.append(f"- {name}({param_str}): {desc}")
         return "\n".join(lines)
 
-    def _parse_response(self, response: str) -> dict[str, Any]:
+    def _parse_response(self, response: str, expect_json: bool = True) -> dict[str, Any]:
         response = response.strip()
-        # Try direct JSON parse
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            pass
-        # Try to extract JSON from markdown code block
-        match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-        # Try to find any JSON object
-        match = re.search(r"\{[^{}]*\}", response)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
+        if not expect_json:
+            return {"final_answer": response}
+        # One brace scan finds the object whether the reply is bare JSON, fenced
+        # in a code block or surrounded by prose.
+        parsed = extract_first_json(response)
+        if parsed is not None:
+            return parsed
         return {"final_answer": response}
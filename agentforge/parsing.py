@@ -0,0 +1,85 @@
+"""JSON helpers: orjson-backed encode/decode and extraction from free-form LLM output."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is a declared dependency
+    orjson = None
+
+
+def loads(data: str | bytes) -> Any:
+    """Decode JSON with orjson when available; raises json.JSONDecodeError on bad input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Encode JSON with orjson when available, returning UTF-8 bytes."""
+    if orjson is not None:
+        # OPT_NON_STR_KEYS matches json.dumps, which stringifies int/float keys.
+        option = orjson.OPT_NON_STR_KEYS
+        option |= (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys).encode()
+
+
+def _json_object_spans(text: str, start: int = 0) -> list[tuple[int, int]]:
+    """Return the ``(begin, end)`` spans of every brace-balanced ``{...}``, ordered by begin.
+
+    Opening braces are pushed on a stack and popped by their matching close in
+    one forward pass that tracks string/escape state, so braces inside string
+    literals are ignored, a stray ``{`` in prose just stays unmatched, and there
+    is no regex backtracking. Quotes outside any object are prose and ignored.
+    A ``{`` that a pass reads as string content is rescanned from itself, since
+    scanning from it would read the following quotes the other way round; only
+    such braces start another pass.
+    """
+    spans: dict[int, int] = {}
+    resolved: set[int] = set()
+    pos = text.find("{", start)
+    while pos != -1:
+        stack: list[int] = []
+        in_string = False
+        escape = False
+        quoted: list[int] = []
+        for i in range(pos, len(text)):
+            ch = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                elif ch == "{":
+                    quoted.append(i)
+            elif ch == '"':
+                in_string = bool(stack)
+            elif ch == "{":
+                stack.append(i)
+                resolved.add(i)
+            elif ch == "}" and stack:
+                spans[stack.pop()] = i + 1
+        pos = next((q for q in quoted if q not in resolved), -1)
+    return sorted(spans.items())
+
+
+def find_json_object(text: str, start: int = 0) -> tuple[int, int] | None:
+    """Return the span of the first brace-balanced ``{...}`` at or after ``start``."""
+    spans = _json_object_spans(text, start)
+    return spans[0] if spans else None
+
+
+def extract_first_json(text: str) -> dict[str, Any] | None:
+    """Parse the first valid JSON object embedded in ``text``, or return None."""
+    for begin, end in _json_object_spans(text):
+        try:
+            return loads(text[begin:end])
+        except json.JSONDecodeError:
+            continue
+    return None
@@ -6,7 +6,7 @@ from dataclasses import dataclass
 from typing import Any
 
 
-@dataclass
+@dataclass(slots=True)
 class RewardSignal:
     value: float  # -1.0 to 1.0
     components: dict[str, float]
@@ -19,7 +19,8 @@ def tool_accuracy_reward(
 ) -> float:
     if not expected_tools:
         return 0.0
-    matched = sum(1 for t in expected_tools if t in called_tools)
+    called = set(called_tools)
+    matched = sum(1 for t in expected_tools if t in called)
     return matched / len(expected_tools)
 
 
@@ -39,19 +40,26 @@ def response_quality_reward(
     return min(score, 1.0)
 
 
+def _scenario_field(scenario: Any, key: str, default: Any) -> Any:
+    if isinstance(scenario, dict):
+        return scenario.get(key, default)
+    return getattr(scenario, key, default)
+
+
 def compute_reward(
     trace: Any,
-    scenario: dict[str, Any],
+    scenario: Any,
 ) -> RewardSignal:
+    """Score ``trace`` against ``scenario``, given as a dict or a scenario dataclass."""
     components: dict[str, float] = {}
 
     # Tool accuracy
-    expected_tools = scenario.get("expected_tool_calls", [])
+    expected_tools = _scenario_field(scenario, "expected_tool_calls", [])
     called_tools = [tc.name for tc in trace.tool_calls]
     components["tool_accuracy"] = tool_accuracy_reward(expected_tools, called_tools)
 
     # Response quality
-    keywords = scenario.get("expected_keywords", [])
+    keywords = _scenario_field(scenario, "expected_keywords", [])
     components["response_quality"] = response_quality_reward(
         trace.final_response, keywords
     )
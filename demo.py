@@ -2,16 +2,13 @@
 """AgentForge Demo — Run the agent through customer support scenarios."""
 
 import argparse
+import os
 import sys
 
-from rich.console import Console
-from rich.panel import Panel
-
-from agentforge.environment import SimulationEnvironment
-from agentforge.local_agent import LocalAgent
-from agentforge.rewards import compute_reward
-
-console = Console()
+# Persist TorchInductor's compiled graphs and kernels across runs; must be set
+# before torch is imported (through agentforge).
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", ".inductor-cache")
+os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
 
 
 def main():
@@ -34,6 +31,17 @@ def main():
     )
     args = parser.parse_args()
 
+    # Imported after argument parsing so --help doesn't wait on torch and transformers.
+    from rich.console import Console
+    from rich.panel import Panel
+
+    from agentforge.core import to_sc_dict
+    from agentforge.environment import SimulationEnvironment
+    from agentforge.local_agent import LocalAgent
+    from agentforge.rewards import compute_reward
+
+    console = Console()
+
     console.print(Panel.fit(
         "[bold green]AgentForge Demo[/bold green]\n"
         f"Model: {args.model}\n"
@@ -51,47 +59,50 @@ def main():
     agent = LocalAgent(model_name=args.model)
 
     tools = env.get_tools_for_agent()
+    # Load the weights and prefill the system prompt before any scenario runs.
+    agent.prepare_tools(tools)
     total_passed = 0
 
-    for i, scenario in enumerate(env.scenarios, 1):
-        console.rule(f"Scenario {i}/{len(env.scenarios)}: {scenario.id}")
-        console.print(f"  Difficulty: [yellow]{scenario.difficulty}[/yellow]")
-        console.print(f"  User: {scenario.user_message[:80]}...")
-        console.print()
-
-        sc_dict = {
-            "id": scenario.id,
-            "user_message": scenario.user_message,
-            "description": scenario.description,
-            "expected_tool_calls": scenario.expected_tool_calls,
-        }
-
-        trace = agent.run_scenario(sc_dict, tools, max_turns=args.max_turns)
+    # Built once per scenario and shared by the agent and the reward, so
+    # expected_keywords reaches compute_reward.
+    sc_dicts = [to_sc_dict(scenario) for scenario in env.scenarios]
+    # First turns run as one batch; each scenario then continues on its own.
+    traces = agent.run_scenarios(sc_dicts, tools, max_turns=args.max_turns)
+
+    for i, (scenario, sc_dict, trace) in enumerate(zip(env.scenarios, sc_dicts, traces), 1):
         eval_result = env.evaluate_trace(scenario, trace)
         reward = compute_reward(trace, sc_dict)
 
-        # Print results
-        status = "[green]PASSED[/green]" if eval_result.passed else "[red]FAILED[/red]"
-        console.print(f"  Status: {status}")
-        console.print(f"  Score: {eval_result.score:.2f}")
-        console.print(f"  Reward: {reward.explanation}")
+        # Collected and printed once, without markup parsing: model output
+        # containing [brackets] is shown verbatim.
+        lines = [
+            f"  Difficulty: {scenario.difficulty}",
+            f"  User: {scenario.user_message[:80]}...",
+            "",
+            f"  Status: {'PASSED' if eval_result.passed else 'FAILED'}",
+            f"  Score: {eval_result.score:.2f}",
+            f"  Reward: {reward.explanation}",
+        ]
 
         if trace.tool_calls:
             tools_called = ", ".join(tc.name for tc in trace.tool_calls)
-            console.print(f"  Tools called: [cyan]{tools_called}[/cyan]")
+            lines.append(f"  Tools called: {tools_called}")
         else:
-            console.print("  Tools called: [dim]none[/dim]")
+            lines.append("  Tools called: none")
 
         if trace.final_response:
             response_preview = trace.final_response[:150].replace("\n", " ")
-            console.print(f"  Response: {response_preview}...")
+            lines.append(f"  Response: {response_preview}...")
 
         if trace.error:
-            console.print(f"  Error: [red]{trace.error}[/red]")
+            lines.append(f"  Error: {trace.error}")
 
         if eval_result.passed:
             total_passed += 1
-        console.print()
+        lines.append("")
+
+        console.rule(f"Scenario {i}/{len(env.scenarios)}: {scenario.id}")
+        console.print("\n".join(lines), markup=False, highlight=False)
 
     # Final summary
     console.rule("[bold]Final Results")
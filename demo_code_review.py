@@ -2,16 +2,13 @@
 """AgentForge Code Review Demo — Run agent through code review scenarios."""
 
 import argparse
+import os
 import sys
 
-from rich.console import Console
-from rich.panel import Panel
-
-from agentforge.environment import SimulationEnvironment
-from agentforge.local_agent import LocalAgent
-from agentforge.rewards import compute_reward
-
-console = Console()
+# Persist TorchInductor's compiled graphs and kernels across runs; must be set
+# before torch is imported (through agentforge).
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", ".inductor-cache")
+os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
 
 
 def main():
@@ -28,6 +25,17 @@ def main():
     )
     args = parser.parse_args()
 
+    # Imported after argument parsing so --help doesn't wait on torch and transformers.
+    from rich.console import Console
+    from rich.panel import Panel
+
+    from agentforge.core import to_sc_dict
+    from agentforge.environment import SimulationEnvironment
+    from agentforge.local_agent import LocalAgent
+    from agentforge.rewards import compute_reward
+
+    console = Console()
+
     console.print(Panel.fit(
         "[bold blue]AgentForge — Code Review Agent Demo[/bold blue]\n"
         f"Model: {args.model}\n"
@@ -40,41 +48,44 @@ def main():
 
     agent = LocalAgent(model_name=args.model)
     tools = env.get_tools_for_agent()
+    # Load the weights and prefill the system prompt before any scenario runs.
+    agent.prepare_tools(tools)
     total_passed = 0
 
-    for i, scenario in enumerate(env.scenarios, 1):
-        console.rule(f"Scenario {i}/{len(env.scenarios)}: {scenario.id}")
-        console.print(f"  Difficulty: [yellow]{scenario.difficulty}[/yellow]")
-        console.print(f"  Description: {scenario.description}")
-        console.print(f"  User says: \"{scenario.user_message}\"")
-        console.print()
-
-        sc_dict = {
-            "id": scenario.id,
-            "user_message": scenario.user_message,
-            "description": scenario.description,
-            "expected_tool_calls": scenario.expected_tool_calls,
-        }
-
-        trace = agent.run_scenario(sc_dict, tools)
+    # Built once per scenario and shared by the agent and the reward, so
+    # expected_keywords reaches compute_reward.
+    sc_dicts = [to_sc_dict(scenario) for scenario in env.scenarios]
+    # First turns run as one batch; each scenario then continues on its own.
+    traces = agent.run_scenarios(sc_dicts, tools)
+
+    for i, (scenario, sc_dict, trace) in enumerate(zip(env.scenarios, sc_dicts, traces), 1):
         eval_result = env.evaluate_trace(scenario, trace)
         reward = compute_reward(trace, sc_dict)
 
-        status = "[green]PASSED[/green]" if eval_result.passed else "[red]FAILED[/red]"
-        console.print(f"  Result: {status} (score: {eval_result.score:.2f})")
-        console.print(f"  Reward: {reward.explanation}")
+        # Collected and printed once, without markup parsing: model output
+        # containing [brackets] is shown verbatim.
+        lines = [
+            f"  Difficulty: {scenario.difficulty}",
+            f"  Description: {scenario.description}",
+            f"  User says: \"{scenario.user_message}\"",
+            "",
+            f"  Result: {'PASSED' if eval_result.passed else 'FAILED'} (score: {eval_result.score:.2f})",
+            f"  Reward: {reward.explanation}",
+        ]
 
-        if trace.tool_calls:
-            for tc in trace.tool_calls:
-                console.print(f"    → [cyan]{tc.name}[/cyan]({tc.arguments})")
+        for tc in trace.tool_calls:
+            lines.append(f"    → {tc.name}({tc.arguments})")
 
         if trace.final_response:
             preview = trace.final_response[:200].replace("\n", " ")
-            console.print(f"  Agent response: {preview}")
+            lines.append(f"  Agent response: {preview}")
 
         if eval_result.passed:
             total_passed += 1
-        console.print()
+        lines.append("")
+
+        console.rule(f"Scenario {i}/{len(env.scenarios)}: {scenario.id}")
+        console.print("\n".join(lines), markup=False, highlight=False)
 
     console.rule("[bold]Code Review Results")
     total = len(env.scenarios)
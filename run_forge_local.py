@@ -2,16 +2,14 @@
 """Run the full AgentForge co-evolutionary loop — 100% local, no API keys."""
 
 import argparse
+import logging
+import os
 import sys
 
-from rich.console import Console
-from rich.panel import Panel
-
-from agentforge.core import AgentForge
-from agentforge.environment import SimulationEnvironment
-from agentforge.local_agent import LocalAgent
-
-console = Console()
+# Persist TorchInductor's compiled graphs and kernels across runs; must be set
+# before torch is imported (through agentforge).
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", ".inductor-cache")
+os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
 
 
 def main():
@@ -39,8 +37,37 @@ def main():
         default="generated_scenarios",
         help="Output directory for generated scenarios",
     )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Reuse failure analyses for near-duplicate traces (needs agentforge[cache])",
+    )
+    parser.add_argument(
+        "--log-file",
+        default=None,
+        help="Write one JSON line per evaluated scenario to this file",
+    )
     args = parser.parse_args()
 
+    if args.log_file:
+        # Only the per-scenario records from agentforge.core go to the file;
+        # the root logger is left alone so library INFO messages stay out.
+        handler = logging.FileHandler(args.log_file)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        scenario_log = logging.getLogger("agentforge.core")
+        scenario_log.setLevel(logging.INFO)
+        scenario_log.addHandler(handler)
+
+    # Imported after argument parsing so --help doesn't wait on torch and transformers.
+    from rich.console import Console
+    from rich.panel import Panel
+
+    from agentforge.core import AgentForge
+    from agentforge.environment import SimulationEnvironment
+    from agentforge.local_agent import LocalAgent
+
+    console = Console()
+
     console.print(Panel.fit(
         "[bold green]AgentForge — Co-Evolutionary Loop (100% Local)[/bold green]\n"
         f"Model: {args.model}\n"
@@ -54,12 +81,19 @@ def main():
     console.print("\n[bold]Initializing...[/bold]")
     agent = LocalAgent(model_name=args.model)
     env = SimulationEnvironment(config_path=args.config)
+    # Load the weights up front rather than inside the first scored scenario.
+    agent.prepare_tools(env.get_tools_for_agent())
 
     console.print(f"  Scenarios: {len(env.scenarios)}")
     console.print(f"  Tools: {', '.join(env.tools.keys())}")
     console.print()
 
-    forge = AgentForge(env=env, agent=agent, output_dir=args.output)
+    forge = AgentForge(
+        env=env,
+        agent=agent,
+        output_dir=args.output,
+        semantic_cache=args.semantic_cache,
+    )
     forge.run(num_rounds=args.rounds)
 
     console.print("\n[bold green]Done![/bold green]")
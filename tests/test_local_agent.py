@@ -1,10 +1,71 @@
-"""Tests for LocalAgent — mocked so they don't need a real model."""
+"""Tests for LocalAgent — mocked or run on a tiny random model, so nothing is downloaded."""
 
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from agentforge.local_agent import AgentTrace, LocalAgent, ToolCall
+from agentforge.local_agent import AgentTrace, LocalAgent, ToolCall, _Conversation
+
+CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ '<|im_start|>' + message['role'] + '\\n' + message['content'] + '<|im_end|>\\n' }}"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}{{ '<|im_start|>assistant\\n' }}{% endif %}"
+)
+
+
+@pytest.fixture(scope="module")
+def tiny_agent(tmp_path_factory):
+    """LocalAgent backed by a tiny randomly initialised Qwen2 model, decoding greedily."""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+
+    model_dir = tmp_path_factory.mktemp("tiny-qwen2")
+    bpe = Tokenizer(models.BPE())
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    bpe.train_from_iterator(
+        ['You are a helpful agent. {"tool": "lookup_order", "args": {}} final_answer'] * 10,
+        trainers.BpeTrainer(
+            vocab_size=400,
+            special_tokens=["<|endoftext|>", "<|im_start|>", "<|im_end|>"],
+            initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        ),
+    )
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=bpe, eos_token="<|im_end|>", pad_token="<|endoftext|>"
+    )
+    tokenizer.chat_template = CHAT_TEMPLATE
+    tokenizer.save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    Qwen2ForCausalLM(Qwen2Config(
+        vocab_size=len(tokenizer), hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2,
+        eos_token_id=tokenizer.eos_token_id, pad_token_id=tokenizer.pad_token_id,
+    )).save_pretrained(model_dir)
+
+    agent = LocalAgent(model_name=str(model_dir), max_new_tokens=8)
+    agent._load_model()
+    sample = agent._model.generate
+
+    def greedy(*args, **kwargs):
+        kwargs.update(do_sample=False, temperature=None, top_p=None)
+        return sample(*args, **kwargs)
+
+    agent._model.generate = greedy
+    return agent
+
+
+@pytest.fixture
+def shared_model_cache():
+    """Empty the process-wide model cache around tests that load mocked models."""
+    from agentforge.local_agent import _load_shared_model
+
+    _load_shared_model.cache_clear()
+    yield _load_shared_model
+    _load_shared_model.cache_clear()
 
 
 class TestToolCall:
@@ -32,9 +93,100 @@ class TestLocalAgent:
         assert agent.max_new_tokens == 512
 
     def test_init_custom(self):
-        agent = LocalAgent(model_name="custom/model", max_new_tokens=256)
+        agent = LocalAgent(model_name="custom/model", max_new_tokens=256, dtype="float16")
         assert agent.model_name == "custom/model"
         assert agent.max_new_tokens == 256
+        assert agent.dtype == "float16"
+
+    def test_default_dtype(self):
+        import torch
+
+        from agentforge.local_agent import _default_dtype
+
+        with patch("torch.cuda.is_available", return_value=False):
+            assert _default_dtype() == torch.float32
+        with patch("torch.cuda.is_available", return_value=True), \
+                patch("torch.cuda.is_bf16_supported", return_value=True):
+            assert _default_dtype() == torch.bfloat16
+        with patch("torch.cuda.is_available", return_value=True), \
+                patch("torch.cuda.is_bf16_supported", return_value=False):
+            assert _default_dtype() == torch.float16
+
+    def test_load_model_compiles_forward(self, shared_model_cache):
+        from agentforge.local_agent import _compile_supported
+
+        with patch("torch.__version__", "2.0.1"):
+            assert not _compile_supported()
+        with patch("torch.__version__", "2.10.0+cu121"):
+            assert _compile_supported()
+
+        def load(**agent_kwargs):
+            shared_model_cache.cache_clear()
+            model = MagicMock()
+            forward = model.forward
+            with patch("transformers.AutoTokenizer.from_pretrained"), \
+                    patch("transformers.AutoModelForCausalLM.from_pretrained",
+                          return_value=model), \
+                    patch("torch.cuda.is_available", return_value=True), \
+                    patch("torch.compile", return_value="compiled") as compile_:
+                LocalAgent(dtype="float32", **agent_kwargs)._load_model()
+            return forward, compile_
+
+        # CUDA graphs only with the static cache; a growing DynamicCache would
+        # record a new graph every step.
+        forward, compile_ = load(static_cache=True)
+        compile_.assert_called_once_with(forward, mode="reduce-overhead", fullgraph=True)
+        forward, compile_ = load(compile_model=True)
+        compile_.assert_called_once_with(forward, mode="default", dynamic=True)
+        _, compile_ = load()
+        compile_.assert_not_called()
+
+    def test_load_model_attention_backend(self, shared_model_cache):
+        import torch
+
+        from agentforge.local_agent import _flash_available
+
+        with patch("importlib.util.find_spec", return_value=None):
+            assert not _flash_available()
+        with patch("importlib.util.find_spec", return_value=object()), \
+                patch("torch.cuda.is_available", return_value=True), \
+                patch("torch.cuda.get_device_capability", return_value=(8, 6)):
+            assert _flash_available()
+
+        for dtype, flash, expected in [
+            (torch.bfloat16, True, "flash_attention_2"),
+            (torch.float32, True, "sdpa"),
+            (torch.float16, False, "sdpa"),
+        ]:
+            with patch("transformers.AutoTokenizer.from_pretrained"), \
+                    patch("transformers.AutoModelForCausalLM.from_pretrained") as load, \
+                    patch("agentforge.local_agent._flash_available", return_value=flash):
+                LocalAgent(dtype=dtype, compile_model=False)._load_model()
+            assert load.call_args.kwargs["attn_implementation"] == expected
+
+    def test_load_model_shared_between_agents(self, shared_model_cache):
+        with patch("transformers.AutoTokenizer.from_pretrained"), \
+                patch("transformers.AutoModelForCausalLM.from_pretrained") as load:
+            first, second = LocalAgent(compile_model=False), LocalAgent(compile_model=False)
+            first._load_model()
+            second._load_model()
+            LocalAgent(model_name="other/model", compile_model=False)._load_model()
+        assert first._model is second._model
+        assert load.call_count == 2
+
+    def test_quantization_config(self):
+        import torch
+
+        from agentforge.local_agent import _quantization_config
+
+        assert _quantization_config("none", torch.float32) is None
+        assert _quantization_config("int8", torch.float16).load_in_8bit
+        nf4 = _quantization_config("nf4", torch.bfloat16)
+        assert nf4.load_in_4bit
+        assert nf4.bnb_4bit_quant_type == "nf4"
+        assert nf4.bnb_4bit_compute_dtype == torch.bfloat16
+        with pytest.raises(ValueError):
+            _quantization_config("int3", torch.float32)
 
     def test_parse_response_json(self):
         agent = LocalAgent()
@@ -56,6 +208,13 @@ class TestLocalAgent:
         result = agent._parse_response('```json\n{"tool": "check_inventory", "args": {}}\n```')
         assert result["tool"] == "check_inventory"
 
+    def test_parse_response_nested_object_in_text(self):
+        agent = LocalAgent()
+        result = agent._parse_response(
+            'Calling: {"tool": "lookup_order", "args": {"order_id": "123"}} now'
+        )
+        assert result == {"tool": "lookup_order", "args": {"order_id": "123"}}
+
     def test_format_tools(self):
         agent = LocalAgent()
         tools = {
@@ -68,6 +227,15 @@ class TestLocalAgent:
         assert "lookup_order" in formatted
         assert "Look up an order" in formatted
 
+    def test_system_message_cached_per_tools_object(self):
+        agent = LocalAgent()
+        tools = {"lookup_order": {"description": "Look up an order"}}
+        message = agent._system_message(tools)
+        assert agent._system_message(tools) is message
+        other = agent._system_message({"check_inventory": {"description": "Check stock"}})
+        assert "check_inventory" in other["content"]
+        assert "lookup_order" not in other["content"]
+
     @patch.object(LocalAgent, "generate")
     def test_run_scenario_with_final_answer(self, mock_generate):
         mock_generate.return_value = '{"final_answer": "Your order is shipped."}'
@@ -116,6 +284,12 @@ class TestLocalAgent:
         assert len(trace.tool_calls) == 1
         assert trace.tool_calls[0].name == "lookup_order"
         assert trace.final_response == "Order 123 is shipped."
+        assert [c.kwargs["kind"] for c in mock_generate.call_args_list] == ["tool", "tool"]
+
+        mock_generate.reset_mock(side_effect=True)
+        mock_generate.return_value = '{"final_answer": "done"}'
+        agent.run_scenario(scenario, tools, max_turns=1)
+        assert mock_generate.call_args.kwargs["kind"] == "final"
 
     @patch.object(LocalAgent, "generate")
     def test_run_scenario_unknown_tool(self, mock_generate):
@@ -126,10 +300,279 @@ class TestLocalAgent:
 
         agent = LocalAgent()
         scenario = {"id": "test_3", "user_message": "Help me", "description": "Unknown tool"}
-        tools = {}
+        tools = {"lookup_order": {"description": "Look up an order", "function": lambda **kwargs: {}}}
 
         trace = agent.run_scenario(scenario, tools, max_turns=5)
         assert trace.tool_calls[0].name == "nonexistent_tool"
+        assert trace.messages[2]["content"] == "Error: Unknown tool 'nonexistent_tool'"
+
+    @patch.object(LocalAgent, "generate")
+    def test_run_scenario_without_tools_answers_directly(self, mock_generate):
+        mock_generate.return_value = ' Use {"key": 1} as the config. '
+
+        scenario = {"id": "test_4", "user_message": "Help me", "description": "No tools"}
+        for agent, tools in [
+            (LocalAgent(), {}),
+            (LocalAgent(tool_mode=False), {"lookup_order": {"description": "Look up an order"}}),
+        ]:
+            trace = agent.run_scenario(scenario, tools, max_turns=3)
+            assert trace.final_response == 'Use {"key": 1} as the config.'
+            assert not trace.tool_calls
+            messages = mock_generate.call_args.args[0]
+            assert "JSON" not in messages[0]["content"]
+            assert mock_generate.call_args.kwargs["kind"] == "final"
+
+    @patch.object(LocalAgent, "generate")
+    @patch.object(LocalAgent, "generate_batch")
+    def test_run_scenarios_batches_first_turn(self, mock_batch, mock_generate):
+        mock_batch.return_value = [
+            '{"tool": "lookup_order", "args": {"order_id": "1"}}',
+            '{"final_answer": "Nothing to do."}',
+        ]
+        mock_generate.return_value = '{"final_answer": "Order 1 is shipped."}'
+        tools = {
+            "lookup_order": {
+                "description": "Look up an order",
+                "parameters": {"order_id": "string"},
+                "function": lambda **kwargs: {"status": "shipped"},
+            }
+        }
+        scenarios = [
+            {"id": "a", "user_message": "Check order 1"},
+            {"id": "b", "user_message": "Hello"},
+        ]
+
+        agent = LocalAgent()
+        traces = agent.run_scenarios(scenarios, tools, max_turns=3)
+        assert [t.scenario_id for t in traces] == ["a", "b"]
+        assert traces[0].final_response == "Order 1 is shipped."
+        assert traces[1].final_response == "Nothing to do."
+        batch = mock_batch.call_args.args[0]
+        assert [m[1]["content"] for m in batch] == ["Check order 1", "Hello"]
+        assert mock_batch.call_args.kwargs["kind"] == "tool"
+        mock_generate.assert_called_once()
+        assert agent.run_scenarios([], tools) == []
+
+    def test_generate_batch_empty(self):
+        agent = LocalAgent()
+        assert agent.generate_batch([]) == []
+
+
+class TestParsing:
+    def test_extract_first_json(self):
+        from agentforge.parsing import extract_first_json
+
+        assert extract_first_json('{"a": 1}') == {"a": 1}
+        assert extract_first_json('Sure! ```json\n{"a": {"b": "}"}}\n``` done') == {"a": {"b": "}"}}
+        assert extract_first_json('use {braces} then {"a": "x\\"y"} {"b": 2}') == {"a": 'x"y'}
+        assert extract_first_json("no json here") is None
+        assert extract_first_json('{"unterminated": ') is None
+        assert extract_first_json('Use { to start. {"tool": "lookup_order", "args": {}}') == {
+            "tool": "lookup_order", "args": {}
+        }
+        assert extract_first_json('I\'ll call it "now {" then {"tool": "x", "args": {}}') == {
+            "tool": "x", "args": {}
+        }
+        assert extract_first_json('He said "hi. {"tool": "x"}') == {"tool": "x"}
+
+    def test_extract_first_json_is_linear_in_unbalanced_braces(self):
+        import time
+
+        from agentforge.parsing import extract_first_json
+
+        # A rescan from every stray "{" would be quadratic: seconds at this size.
+        text = "{" * 50_000 + '{"tool": "x", "args": {}}'
+        started = time.perf_counter()
+        assert extract_first_json(text) == {"tool": "x", "args": {}}
+        assert time.perf_counter() - started < 0.5
+
+    def test_dumps_round_trip(self):
+        from agentforge.parsing import dumps, loads
+
+        assert loads(dumps({"b": 1, "a": [True, None]}, sort_keys=True)) == {"a": [True, None], "b": 1}
+        assert loads(dumps({1: "x"})) == {"1": "x"}
+
+
+class TestFailureAnalyzer:
+    def test_analyze_batches_failed_traces(self):
+        from agentforge.analyzer import FailureAnalyzer
+
+        agent = LocalAgent()
+        agent.generate_batch = MagicMock(return_value=[
+            '{"failure_type": "wrong_tool", "weakness_category": "tool_selection"}',
+            "not json",
+        ])
+        traces = [
+            AgentTrace(scenario_id="s1", final_response="I can't help"),
+            AgentTrace(scenario_id="s2", final_response="Try again later"),
+            AgentTrace(scenario_id="s3", success=True),
+        ]
+
+        analyses = FailureAnalyzer(agent=agent).analyze(traces)
+        agent.generate_batch.assert_called_once()
+        batch = agent.generate_batch.call_args[0][0]
+        assert len(batch) == 2
+        # The invariant instructions lead every prompt so their KV cache is shared.
+        assert batch[0][0] == batch[1][0]
+        assert batch[0][0]["role"] == "system"
+        assert [a.scenario_id for a in analyses] == ["s1", "s2"]
+        assert analyses[0].weakness_category == "tool_selection"
+        assert analyses[1].failure_type == "unknown"
+
+    def test_analyze_deduplicates_identical_traces(self):
+        from agentforge.analyzer import FailureAnalyzer
+
+        agent = LocalAgent()
+        agent.generate_batch = MagicMock(return_value=[
+            '{"failure_type": "no_tool", "weakness_category": "tool_selection"}',
+            '{"failure_type": "wrong_tool", "weakness_category": "reasoning"}',
+        ])
+        traces = [
+            AgentTrace(scenario_id="s1", final_response="Sorry"),
+            AgentTrace(scenario_id="s2", tool_calls=[ToolCall(name="lookup_order", arguments={})]),
+            AgentTrace(scenario_id="s3", final_response="Sorry"),
+        ]
+
+        analyses = FailureAnalyzer(agent=agent).analyze(traces)
+        assert len(agent.generate_batch.call_args[0][0]) == 2
+        assert [a.scenario_id for a in analyses] == ["s1", "s2", "s3"]
+        assert [a.failure_type for a in analyses] == ["no_tool", "wrong_tool", "no_tool"]
+
+    def test_summarize(self):
+        from agentforge.analyzer import FailureAnalysis, FailureAnalyzer
+
+        analyses = [
+            FailureAnalysis("s1", "x", "y", "reasoning", "z"),
+            FailureAnalysis("s2", "x", "y", "tool_selection", "z"),
+            FailureAnalysis("s3", "x", "y", "tool_selection", "z"),
+        ]
+        summary = FailureAnalyzer(agent=LocalAgent()).summarize(analyses)
+        assert summary["total_failures"] == 3
+        assert summary["categories"] == {"reasoning": 1, "tool_selection": 2}
+        assert summary["top_weakness"] == "tool_selection"
+
+    def test_analyze_falls_back_to_errored_traces(self):
+        from agentforge.analyzer import FailureAnalyzer
+
+        agent = LocalAgent()
+        agent.generate_batch = MagicMock(return_value=['{"failure_type": "crash"}'])
+        traces = [
+            AgentTrace(scenario_id="ok", success=True),
+            AgentTrace(scenario_id="boom", error="timeout"),
+        ]
+
+        analyses = FailureAnalyzer(agent=agent).analyze(traces)
+        assert [a.scenario_id for a in analyses] == ["boom"]
+        assert FailureAnalyzer(agent=agent).analyze(traces[:1]) == []
+
+
+class TestScenarioGenerator:
+    def test_generate_single_batched_call(self):
+        from agentforge.generator import ScenarioGenerator
+
+        agent = LocalAgent()
+        agent.generate_batch = MagicMock(return_value=[
+            '{"description": "Hard refund", "difficulty": "hard"}',
+        ] * 3)
+
+        generated = ScenarioGenerator(agent=agent).generate(
+            failure_summary={"top_weakness": "reasoning"},
+            existing_scenarios=[],
+            available_tools=["lookup_order"],
+            num_scenarios=3,
+        )
+        agent.generate_batch.assert_called_once()
+        assert [g.id for g in generated] == ["gen_1_0", "gen_2_1", "gen_3_2"]
+        assert generated[0].description == "Hard refund"
+
+
+class TestLocalAgentGeneration:
+    SYSTEM = {"role": "system", "content": "You are a helpful agent."}
+
+    def test_conversation_resumes_from_cached_ids(self, tiny_agent):
+        turn1 = [self.SYSTEM, {"role": "user", "content": "Check order 123"}]
+        turn2 = turn1 + [
+            {"role": "assistant", "content": '{"tool": "lookup_order", "args": {}}'},
+            {"role": "user", "content": "Tool result: shipped"},
+        ]
+
+        conversation = _Conversation()
+        tiny_agent.generate(turn1, cache_prefix=True, conversation=conversation)
+        turn1_ids = conversation.input_ids
+        assert conversation.past_key_values.get_seq_length() == conversation.past_ids.shape[-1]
+        cached = tiny_agent.generate(turn2, cache_prefix=True, conversation=conversation)
+
+        assert conversation.input_ids.shape[-1] > turn1_ids.shape[-1]
+        assert conversation.input_ids[:, : turn1_ids.shape[-1]].equal(turn1_ids)
+        assert cached == tiny_agent.generate(turn2)
+
+    def test_json_object_stop(self, tiny_agent):
+        import torch
+
+        from agentforge.local_agent import _JsonObjectStop
+
+        tokenizer = tiny_agent._tokenizer
+        prompt = tokenizer("You are", return_tensors="pt")["input_ids"]
+        stop = _JsonObjectStop(tokenizer, prompt.shape[-1])
+
+        def check(text):
+            ids = tokenizer(text, return_tensors="pt", add_special_tokens=False)["input_ids"]
+            return bool(stop(torch.cat([prompt, ids], dim=-1), None)[0])
+
+        assert not check('{"tool": "lookup_order", "args": {}')
+        assert not check('{"tool": "lookup_order", "args": {"order_id": "1"}')
+        assert not check('{"final_answer": "a } b"')
+        assert check('{"tool": "lookup_order", "args": {}}')
+        assert check('Use { to start. {"final_answer": "done"}')
+
+    def test_long_tool_call_is_not_truncated(self, tiny_agent):
+        comment = " ".join(f"note{i}" for i in range(200))
+        reply = '{"tool": "post_comment", "args": {"comment": "%s"}}' % comment
+        reply_ids = tiny_agent._tokenizer(reply, add_special_tokens=False)["input_ids"]
+        agent = LocalAgent(max_new_tokens=len(reply_ids) + 8)
+        assert agent._decoding_kwargs("tool", 0)["max_new_tokens"] > len(reply_ids) > 128
+        assert LocalAgent()._decoding_kwargs("tool", 0)["max_new_tokens"] == 512
+        assert agent._parse_response(reply) == {
+            "tool": "post_comment", "args": {"comment": comment}
+        }
+
+    def test_tool_turn_respects_token_budget(self, tiny_agent):
+        messages = [self.SYSTEM, {"role": "user", "content": "Check order 123"}]
+        with patch.object(tiny_agent, "tool_max_new_tokens", 3), \
+                patch.object(tiny_agent._model, "generate", wraps=tiny_agent._model.generate) as spy:
+            tiny_agent.generate(messages, kind="tool")
+        kwargs = spy.call_args.kwargs
+        assert kwargs["max_new_tokens"] == 3
+        assert kwargs["do_sample"] is False
+        assert kwargs["stopping_criteria"]
+
+    def test_static_cache_matches_dynamic(self, tiny_agent):
+        import torch
+
+        from agentforge.local_agent import _pad_to_bucket
+
+        ids, mask = _pad_to_bucket(torch.ones(1, 5, dtype=torch.long), torch.ones(1, 5), 0)
+        assert ids.tolist() == [[0, 0, 0, 1, 1, 1, 1, 1]]
+        assert mask.tolist() == [[0, 0, 0, 1, 1, 1, 1, 1]]
+
+        static = LocalAgent(model_name=tiny_agent.model_name, max_new_tokens=8, static_cache=True)
+        messages = [self.SYSTEM, {"role": "user", "content": "Check order 123"}]
+        conversation = _Conversation()
+        assert static.generate(
+            messages, cache_prefix=True, conversation=conversation, kind="tool"
+        ) == tiny_agent.generate(messages, kind="tool")
+        assert conversation.past_key_values is None
+        assert not static._prefix_caches
+
+    def test_generate_batch_prefix_matches_uncached(self, tiny_agent):
+        batch = [
+            [self.SYSTEM, {"role": "user", "content": "hi"}],
+            [self.SYSTEM, {"role": "user", "content": "a much longer request about an order"}],
+        ]
+        assert tiny_agent.generate_batch(batch, cache_prefix=True) == tiny_agent.generate_batch(batch)
+        assert tiny_agent.generate_batch(
+            batch, cache_prefix=True, kind="tool"
+        ) == tiny_agent.generate_batch(batch, kind="tool")
 
 
 class TestEnvironment:
@@ -151,6 +594,38 @@ class TestEnvironment:
         assert "lookup_order" in tools
         assert "function" in tools["lookup_order"]
         assert callable(tools["lookup_order"]["function"])
+        assert env.get_tools_for_agent() is tools
+
+        env.load_config("configs/code_review.yaml")
+        assert env.get_tools_for_agent() is not tools
+        assert set(env.get_tools_for_agent()) == set(env.tools)
+
+    def test_evaluate_trace_tool_matching(self):
+        from agentforge.environment import SimulationEnvironment
+
+        env = SimulationEnvironment(config_path="configs/customer_support.yaml")
+        scenario = env.scenarios[0]
+        scenario.expected_tool_calls = ["lookup_order", "issue_refund"]
+        trace = AgentTrace(
+            scenario_id=scenario.id,
+            tool_calls=[ToolCall(name="lookup_order", arguments={})] * 3,
+            final_response="Shipped",
+        )
+        result = env.evaluate_trace(scenario, trace)
+        assert result.details["tool_call_score"] == 0.5
+        assert result.details["called_tools"] == ["lookup_order"] * 3
+        assert result.score == pytest.approx(0.75)
+
+    def test_mock_function_responses(self):
+        from agentforge.environment import SimulationEnvironment
+
+        env = SimulationEnvironment(config_path="configs/customer_support.yaml")
+        lookup = env.tools["lookup_order"].function
+        assert lookup(order_id="ORD-99999") == {"error": "Order not found"}
+        assert lookup(order_id="ORD-55555")["status"] == "processing"
+        assert lookup(order_id="ORD-00001")["status"] == "shipped"
+        assert lookup(order_id=["unhashable"])["status"] == "shipped"
+        assert lookup(order_id={"not", "json"})["status"] == "shipped"
 
 
 class TestRewards:
@@ -177,6 +652,21 @@ class TestRewards:
         reward = compute_reward(trace, scenario)
         assert reward.value > -1.0
 
+    def test_compute_reward_accepts_scenario_dataclass(self):
+        from agentforge.environment import Scenario
+        from agentforge.rewards import compute_reward
+
+        trace = AgentTrace(scenario_id="s1", final_response="Your refund is approved.")
+        trace.tool_calls.append(ToolCall(name="issue_refund", arguments={}))
+        scenario = Scenario(
+            id="s1", description="desc", user_message="Refund me", difficulty="easy",
+            expected_tool_calls=["issue_refund"], expected_keywords=["refund", "approved"],
+        )
+        as_dict = {"expected_tool_calls": ["issue_refund"], "expected_keywords": ["refund", "approved"]}
+        reward = compute_reward(trace, scenario)
+        assert reward.components == compute_reward(trace, as_dict).components
+        assert reward.components["response_quality"] == 1.0
+
 
 class TestCurriculum:
     def test_build_and_advance(self):
@@ -197,6 +687,20 @@ class TestCurriculum:
         assert c.advance(0.9)  # pass hard
         assert c.is_complete()
 
+    def test_stages_follow_difficulty_order(self):
+        from agentforge.curriculum import Curriculum
+
+        c = Curriculum()
+        c.build_from_scenarios([
+            {"id": "h1", "difficulty": "hard"},
+            {"id": "m1"},
+            {"id": "e1", "difficulty": "easy"},
+            {"id": "h2", "difficulty": "hard"},
+            {"id": "x1", "difficulty": "expert"},
+        ])
+        assert [s.difficulty for s in c.stages] == ["easy", "medium", "hard"]
+        assert c.stages[2].scenario_ids == ["h1", "h2"]
+
     def test_fail_to_advance(self):
         from agentforge.curriculum import Curriculum
 
@@ -204,3 +708,149 @@ class TestCurriculum:
         c.build_from_scenarios([{"id": "s1", "difficulty": "easy"}])
         assert not c.advance(0.2)  # fail
         assert not c.is_complete()
+
+
+class TestAgentForge:
+    def _make_forge(self, tmp_path):
+        from agentforge.core import AgentForge
+        from agentforge.environment import SimulationEnvironment
+
+        env = SimulationEnvironment(config_path="configs/customer_support.yaml")
+        return AgentForge(env=env, agent=LocalAgent(), output_dir=str(tmp_path))
+
+    @patch.object(LocalAgent, "prepare_tools")
+    @patch.object(LocalAgent, "generate")
+    def test_run_evaluation_preserves_order(self, mock_generate, mock_prepare, tmp_path, caplog):
+        import asyncio
+        import json
+        import logging
+
+        mock_generate.return_value = '{"final_answer": "Done."}'
+        forge = self._make_forge(tmp_path)
+
+        with caplog.at_level(logging.INFO, logger="agentforge.core"):
+            results = asyncio.run(forge.run_evaluation(forge.env.scenarios))
+        logged = [json.loads(r.getMessage()) for r in caplog.records]
+        assert {r["scenario_id"] for r in logged} == set(results.scenario_ids)
+        assert all(r["label"] == "base" for r in logged)
+        mock_prepare.assert_called_once_with(forge.env.get_tools_for_agent())
+        assert results.scenario_ids == [sc.id for sc in forge.env.scenarios]
+        assert all(t.final_response == "Done." for t in results.traces)
+        assert results.scores.shape == (len(forge.env.scenarios),)
+
+    @patch.object(LocalAgent, "prepare_tools")
+    @patch.object(LocalAgent, "generate_batch")
+    @patch.object(LocalAgent, "generate")
+    def test_run_round(self, mock_generate, mock_generate_batch, mock_prepare, tmp_path):
+        mock_generate.return_value = '{"final_answer": "Done."}'
+        mock_generate_batch.side_effect = lambda batch, **kwargs: [
+            '{"description": "Harder", "user_message": "Help", "difficulty": "hard"}'
+        ] * len(batch)
+        forge = self._make_forge(tmp_path)
+
+        forge_round = forge.run_round(1)
+        assert len(forge_round.base_results) == len(forge.env.scenarios)
+        assert len(forge_round.generated_results) == 3
+        assert forge_round.base_avg == pytest.approx(
+            sum(forge_round.base_results.scores) / len(forge.env.scenarios)
+        )
+        assert (tmp_path / "round_1.json").exists()
+        forge._print_final_summary()
+
+    def test_to_sc_dict(self):
+        from agentforge.core import to_sc_dict
+        from agentforge.environment import Scenario
+        from agentforge.generator import GeneratedScenario
+
+        expected = {
+            "id": "s1",
+            "user_message": "Help",
+            "description": "desc",
+            "expected_tool_calls": ["lookup_order"],
+            "expected_keywords": [],
+        }
+        scenario = Scenario(
+            id="s1", description="desc", user_message="Help", difficulty="easy",
+            expected_tool_calls=["lookup_order"],
+        )
+        generated = GeneratedScenario(
+            id="s1", description="desc", user_message="Help", difficulty="hard",
+            target_weakness="reasoning", expected_tool_calls=["lookup_order"],
+        )
+        assert to_sc_dict(scenario) == expected
+        assert to_sc_dict(generated) == expected
+        assert to_sc_dict(dict(expected, difficulty="easy")) == expected
+        assert to_sc_dict({})["id"] == "unknown"
+
+    def test_round_stats(self):
+        import numpy as np
+
+        from agentforge._fastpath import round_stats
+
+        mean, pass_rate = round_stats(np.array([0.5, 1.0, 0.0]), np.array([True, True, False]))
+        assert mean == pytest.approx(0.5)
+        assert pass_rate == pytest.approx(2 / 3)
+        assert round_stats(np.zeros(0), np.zeros(0, dtype=bool)) == (0.0, 0.0)
+
+
+class TestSemanticCache:
+    @staticmethod
+    def _fake_embed(text):
+        import numpy as np
+
+        vec = np.zeros(26, dtype=np.float32)
+        for ch in text.lower():
+            if ch.isalpha():
+                vec[ord(ch) - ord("a")] += 1
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+    def test_lookup_hit_and_miss(self):
+        from agentforge.cache import SemanticCache
+
+        cache = SemanticCache(threshold=0.95)
+        with patch.object(SemanticCache, "_embed", side_effect=self._fake_embed):
+            assert cache.lookup("refund order") is None
+            cache.add("refund order", '{"failure_type": "x"}')
+            assert cache.lookup("order refund") == '{"failure_type": "x"}'
+            assert cache.lookup("zzz") is None
+
+    def test_ttl_and_persistence(self, tmp_path):
+        from agentforge.cache import SemanticCache
+
+        path = str(tmp_path / "sem_cache.npz")
+        with patch.object(SemanticCache, "_embed", side_effect=self._fake_embed):
+            cache = SemanticCache(path=path)
+            cache.add("refund order", "cached")
+            cache.save()
+
+            reloaded = SemanticCache(path=path)
+            assert len(reloaded) == 1
+            assert reloaded.lookup("refund order") == "cached"
+
+            expired = SemanticCache(path=path, ttl_seconds=0)
+            assert len(expired) == 0
+
+    def test_analyzer_skips_llm_on_hit(self):
+        from agentforge.analyzer import FailureAnalyzer
+        from agentforge.cache import SemanticCache
+
+        agent = LocalAgent()
+        agent.generate_batch = MagicMock(return_value=['{"failure_type": "wrong_tool"}'])
+        with patch.object(SemanticCache, "_embed", side_effect=self._fake_embed):
+            analyzer = FailureAnalyzer(agent=agent, cache=SemanticCache())
+            first = analyzer.analyze([AgentTrace(scenario_id="s1")])
+            second = analyzer.analyze([AgentTrace(scenario_id="s1")])
+        agent.generate_batch.assert_called_once()
+        assert first[0].failure_type == second[0].failure_type == "wrong_tool"
+
+
+class TestCLI:
+    def test_import_does_not_load_model_stack(self):
+        import subprocess
+        import sys
+
+        code = (
+            "import sys, agentforge.cli; "
+            "assert 'torch' not in sys.modules and 'rich.console' not in sys.modules"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)